@@ -0,0 +1,226 @@
+#!/usr/bin/env python3.11
+# coding=utf-8
+
+# Author: Lukas Vecerka (xvecer30)
+# Date: 2023-12
+
+import glob
+import hashlib
+import os
+import shutil
+import time
+from contextlib import contextmanager
+from typing import Iterable, Iterator
+
+import numpy as np
+import pandas as pd
+
+# Content addressed caches of both parts.
+#
+# Data cache stores frames derived from a source file as Parquet under the
+# content hash of the source, {cache_dir}/{source}-{hash}-{stage}-v{version}
+# .parquet, a changed source or version gives another file and the stale
+# one of the same source and stage is removed when the new one is written.
+#
+# Figure cache stores rendered figures. A figure is stored under the
+# hash of the aggregates it is drawn from and of its plotting parameters,
+# so an unchanged figure is copied from the cache instead of rendered and
+# saved again. Files live in {cache_dir}/figures, their mtime is refreshed
+# on every hit and eviction removes the least recently used ones.
+#
+# The module is shared by izv-part02 and izv-part03, install it once with
+# pip install -e izv-common. atomic_file and evict_files are used by all
+# caches of both parts (figures, data and basemap tiles).
+
+# bump whenever the look of figures changes, invalidates cached figures
+FIGURE_CACHE_VERSION = 1
+
+# limits of the figure cache applied after every stored figure
+MAX_CACHE_BYTES = 256 * 1024 * 1024
+MAX_CACHE_AGE = 30 * 24 * 3600
+
+
+@contextmanager
+def atomic_file(path: str) -> Iterator[str]:
+    # yields temporary path to write to, it replaces path only when the
+    # block succeeds so readers never see half written file, temporary file
+    # is removed when the block fails
+    tmp_file = f"{path}.{os.getpid()}.tmp"
+    try:
+        yield tmp_file
+        os.replace(tmp_file, path)
+    finally:
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
+
+
+def evict_files(
+        paths: Iterable[str], max_bytes: int, max_age: float = None
+) -> int:
+    # removes files unused (by mtime) for max_age seconds and then the least
+    # recently used ones until the rest fits into max_bytes, returns removed
+    # count, temporary files of atomic_file are skipped
+    entries = []
+    for path in paths:
+        if path.endswith(".tmp"):
+            continue
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, path))
+    entries.sort()
+
+    now = time.time()
+    total = sum(size for _, size, _ in entries)
+    removed = 0
+    for mtime, size, path in entries:
+        expired = max_age is not None and now - mtime > max_age
+        if not expired and total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            # removed by another process meanwhile
+            pass
+        total -= size
+        removed += 1
+
+    return removed
+
+
+def file_hash(filename: str) -> str:
+    # content hash of a file
+    digest = hashlib.blake2b(digest_size=16)
+    with open(filename, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def data_cache_file(
+        cache_dir: str, filename: str, stage: str, version: int
+) -> str:
+    # cache file of data derived from filename, stage tells apart different
+    # data of one source (raw, parsed, filtered...) and must not contain "-"
+    source = os.path.splitext(os.path.basename(filename))[0]
+    return os.path.join(
+        cache_dir,
+        f"{source.replace('-', '_')}-{file_hash(filename)}-{stage}"
+        f"-v{version}.parquet",
+    )
+
+
+def read_frame(cache_file: str) -> pd.DataFrame:
+    # cached frame, None when it is not cached (or cache_file is None)
+    if cache_file is None or not os.path.exists(cache_file):
+        return None
+    try:
+        df = pd.read_parquet(cache_file)
+    except Exception:
+        # broken cache file, rebuild it
+        return None
+
+    # arrow returns missing strings as None, keep NaN like read_csv and
+    # pickle do
+    obj_cols = df.select_dtypes("object").columns
+    df[obj_cols] = df[obj_cols].where(df[obj_cols].notna(), np.nan)
+    return df
+
+
+def write_frame(cache_file: str, df: pd.DataFrame) -> bool:
+    # stores frame into the data cache and removes stale files of the same
+    # source and stage, False when arrow can not store the frame (mixed
+    # object columns, e.g. int and str) and the cache is skipped
+    cache_dir = os.path.dirname(cache_file)
+    os.makedirs(cache_dir, exist_ok=True)
+
+    name = os.path.basename(cache_file)
+    source, stage = name.split("-")[0], name.split("-")[-2]
+    for old in glob.glob(os.path.join(cache_dir, f"{source}-*-{stage}-v*")):
+        if old != cache_file and not old.endswith(".tmp"):
+            os.remove(old)
+
+    try:
+        with atomic_file(cache_file) as tmp_file:
+            df.to_parquet(tmp_file)
+    except Exception:
+        return False
+    return True
+
+
+def _hash_part(digest, part):
+    if isinstance(part, (pd.DataFrame, pd.Series)):
+        names = part.columns if isinstance(part, pd.DataFrame) else part.name
+        digest.update(repr(list(np.atleast_1d(names))).encode())
+        digest.update(pd.util.hash_pandas_object(part).to_numpy().tobytes())
+    elif isinstance(part, (np.ndarray, pd.Index)):
+        part = np.asarray(part)
+        digest.update(f"{part.dtype}{part.shape}".encode())
+        if part.dtype == object:
+            digest.update(repr(part.tolist()).encode())
+        else:
+            digest.update(np.ascontiguousarray(part).tobytes())
+    else:
+        digest.update(repr(part).encode())
+    # separator, so that consecutive parts can not merge into one
+    digest.update(b"\0")
+
+
+def figure_key(name: str, *parts) -> str:
+    # hash of the plotting function name, its aggregates and parameters
+    digest = hashlib.blake2b(digest_size=16)
+    _hash_part(digest, (name, FIGURE_CACHE_VERSION))
+    for part in parts:
+        _hash_part(digest, part)
+    return digest.hexdigest()
+
+
+def _figure_file(cache_dir: str, key: str, fig_location: str) -> str:
+    ext = os.path.splitext(fig_location)[1] or ".png"
+    return os.path.join(cache_dir, "figures", f"{key}{ext}")
+
+
+def load_figure(cache_dir: str, key: str, fig_location: str) -> bool:
+    # copies the cached figure to fig_location, False when it is not cached
+    cached = _figure_file(cache_dir, key, fig_location)
+    try:
+        shutil.copyfile(cached, fig_location)
+    except FileNotFoundError:
+        return False
+    os.utime(cached)
+    return True
+
+
+def store_figure(
+        cache_dir: str,
+        key: str,
+        fig_location: str,
+        max_bytes: int = MAX_CACHE_BYTES,
+        max_age: float = MAX_CACHE_AGE,
+):
+    # copies just saved figure into the cache and evicts old figures
+    cached = _figure_file(cache_dir, key, fig_location)
+    os.makedirs(os.path.dirname(cached), exist_ok=True)
+    with atomic_file(cached) as tmp_file:
+        shutil.copyfile(fig_location, tmp_file)
+
+    evict_figures(cache_dir, max_bytes, max_age)
+
+
+def evict_figures(
+        cache_dir: str,
+        max_bytes: int = MAX_CACHE_BYTES,
+        max_age: float = MAX_CACHE_AGE,
+) -> int:
+    # removes figures unused for max_age seconds and then the least recently
+    # used ones until the cache fits into max_bytes, returns removed count
+    figures_dir = os.path.join(cache_dir, "figures")
+    if not os.path.isdir(figures_dir):
+        return 0
+
+    return evict_files(
+        (entry.path for entry in os.scandir(figures_dir) if entry.is_file()),
+        max_bytes,
+        max_age,
+    )
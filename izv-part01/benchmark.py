@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+Porovnani integrate a integrate_many na davce funkci
+f_a(x) = a^2 * x^3 * sin(x) pres interval <-3, 3> a porovnani parseru
+tabulky stanic na velke vygenerovane tabulce.
+
+Spousteni:
+   python3 benchmark.py --params 1000
+   python3 benchmark.py --table-rows 20000
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+import part01
+
+
+def exact(a: np.ndarray) -> np.ndarray:
+    """
+    Exact integral of a^2 * x^3 * sin(x) over <-3, 3> from the antiderivative
+    a^2 * ((6x - x^3) cos(x) + (3x^2 - 6) sin(x)).
+    """
+    def antiderivative(x):
+        return (6 * x - x**3) * np.cos(x) + (3 * x**2 - 6) * np.sin(x)
+
+    return a**2 * (antiderivative(3.0) - antiderivative(-3.0))
+
+
+class Counter:
+    """
+    Vectorized function which counts number of evaluated points.
+    """
+
+    def __init__(self):
+        self.evaluations = 0
+
+    def __call__(self, x, a=1.0):
+        self.evaluations += np.size(x)
+        return a**2 * x**3 * np.sin(x)
+
+
+def bench(params: int, repeat: int = 3):
+    """
+    Prints time, number of function evaluations and maximal error of
+    every integration method for a batch of params values.
+    """
+    a = np.linspace(1.0, 2.0, params)
+    reference = exact(a)
+
+    def run_integrate(f):
+        return np.array([
+            part01.integrate(lambda x, value=value: f(x, value), -3, 3)
+            for value in a
+        ])
+
+    methods = {
+        "integrate (midpoint)": run_integrate,
+        "simpson": lambda f: part01.integrate_many(
+            f, -3, 3, a, method="simpson", steps=100
+        ),
+        "gauss": lambda f: part01.integrate_many(f, -3, 3, a),
+        "adaptive": lambda f: part01.integrate_many(
+            f, -3, 3, a, method="adaptive", tol=1e-10
+        ),
+    }
+
+    print(f"{'method':<22} {'time [ms]':>10} {'evals/curve':>12} "
+          f"{'max error':>10}")
+    for name, method in methods.items():
+        best = None
+        for _ in range(repeat):
+            f = Counter()
+            start = time.perf_counter()
+            result = method(f)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        error = np.max(np.abs(result - reference))
+        print(f"{name:<22} {best * 1000:>10.2f} "
+              f"{f.evaluations / params:>12.0f} {error:>10.1e}")
+
+
+def make_table_html(rows: int, seed: int = 0) -> str:
+    """
+    Page in the layout of the station table with given number of rows.
+    """
+    rng = np.random.default_rng(seed)
+    lat = rng.uniform(48.5, 51.0, rows)
+    long = rng.uniform(12.0, 18.9, rows)
+    height = rng.uniform(150.0, 1600.0, rows)
+
+    lines = [
+        "<html><body><table><tr><td>menu</td></tr></table>",
+        "<table><tr><th>Stanice</th><th>ID</th><th>Sirka</th><th></th>"
+        "<th>Delka</th><th></th><th>Vyska</th></tr>",
+    ]
+    for i in range(rows):
+        height_text = f"{height[i]:,.1f}".replace(",", "\xa0")
+        lines.append(
+            f'<tr><td class="stanice"><strong>Stanice {i}</strong></td>'
+            f"<td>{i}</td><td>{lat[i]:.4f}°</td><td>N</td>"
+            f"<td>{long[i]:.4f}°</td><td>E</td>"
+            f"<td>{height_text}</td></tr>".replace(".", ",")
+        )
+    lines.append("</table></body></html>")
+    return "\n".join(lines)
+
+
+def bench_table(rows: int, repeat: int = 3):
+    """
+    Prints time of parsing a generated table by every parser.
+    """
+    page = make_table_html(rows)
+    parsers = {
+        "bs4 (list of dicts)": lambda: part01.parse_table(page),
+        "fast (columns)": lambda: part01.parse_table_columns(page),
+        "fast (list of dicts)": lambda: part01.parse_table(page, "fast"),
+    }
+
+    assert part01.parse_table(page, "fast") == part01.parse_table(page)
+
+    print(f"{'parser':<22} {'time [ms]':>10} {'rows/s':>12}")
+    for name, parse in parsers.items():
+        best = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            parse()
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        print(f"{name:<22} {best * 1000:>10.2f} {rows / best:>12.0f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Benchmark integrace a parseru tabulky"
+    )
+    parser.add_argument("--params", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--table-rows", type=int, default=None,
+                        help="benchmark parsers of table with rows")
+    args = parser.parse_args()
+    if args.table_rows is not None:
+        bench_table(args.table_rows, args.repeat)
+    else:
+        bench(args.params, args.repeat)
@@ -16,6 +16,14 @@ import requests
 import numpy as np
 from numpy.typing import NDArray
 import matplotlib.pyplot as plt
+from matplotlib.backends.backend_pdf import PdfPages
+import os
+import hashlib
+import html
+import re
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Callable, Dict, Any
 
 
@@ -37,6 +45,287 @@ def integrate(
     return np.sum((x[1:] - x[:-1]) * y)
 
 
+def integrate_many(
+    f: Callable[..., NDArray],
+    a: NDArray | float,
+    b: NDArray | float,
+    params: NDArray | None = None,
+    method: str = "gauss",
+    steps: int = 4,
+    order: int = 8,
+    tol: float = 1e-10,
+    max_depth: int = 30,
+) -> NDArray:
+    """
+    Function for calculating integrals of a batch of functions over a batch
+    of intervals, f is called on all of them at once.
+    Args:
+        f (Callable[..., NDArray]): vectorized function f(x) or f(x, p),
+            called with 2D x (one row per interval or panel) and p with
+            the parameter of every row as a column
+        a (NDArray | float): starts of intervals
+        b (NDArray | float): ends of intervals
+        params (NDArray | None): parameters passed to f, a, b and params
+            are broadcast together into the shape of the result
+        method (str): "simpson" (composite rule with steps intervals),
+            "gauss" (Gauss-Legendre rule of given order on each of steps
+            panels) or "adaptive" (panels are halved until the error
+            estimate of the Gauss-Legendre rule is below tol)
+        steps (int): number of intervals (simpson) or initial panels
+        order (int): number of Gauss-Legendre nodes per panel
+        tol (float): absolute error target of adaptive method
+        max_depth (int): maximal number of halvings of adaptive method
+    Returns:
+        NDArray: value of definite integral for every interval and params
+    """
+    arrays = [np.asarray(a, dtype=float), np.asarray(b, dtype=float)]
+    if params is not None:
+        arrays.append(np.asarray(params))
+    arrays = np.broadcast_arrays(*arrays)
+    shape = arrays[0].shape
+    a, b = arrays[0].ravel(), arrays[1].ravel()
+    params = arrays[2].ravel() if params is not None else None
+
+    def evaluate(x: NDArray, rows: NDArray) -> NDArray:
+        if params is None:
+            return f(x)
+        return f(x, params[rows][:, None])
+
+    if method == "simpson":
+        steps += steps % 2
+        x = a[:, None] + (b - a)[:, None] * np.linspace(0, 1, steps + 1)
+        weights = np.ones(steps + 1)
+        weights[1:-1:2], weights[2:-1:2] = 4, 2
+        y = evaluate(x, np.arange(len(a)))
+        result = (y @ weights) * (b - a) / steps / 3
+        return result.reshape(shape)
+
+    nodes, node_weights = np.polynomial.legendre.leggauss(order)
+
+    def gauss(lo: NDArray, hi: NDArray, rows: NDArray) -> NDArray:
+        half = (hi - lo) / 2
+        y = evaluate((lo + hi)[:, None] / 2 + half[:, None] * nodes, rows)
+        return (y @ node_weights) * half
+
+    # panels of all intervals are kept in flat arrays with row of interval
+    rows = np.repeat(np.arange(len(a)), steps)
+    edges = np.linspace(0, 1, steps + 1)
+    lo = (a[:, None] + (b - a)[:, None] * edges[:-1]).ravel()
+    hi = (a[:, None] + (b - a)[:, None] * edges[1:]).ravel()
+    values = gauss(lo, hi, rows)
+
+    if method == "gauss":
+        return np.bincount(rows, values, len(a)).reshape(shape)
+    if method != "adaptive":
+        raise ValueError(f"unknown integration method {method}")
+
+    result = np.zeros(len(a))
+    length = np.abs(b - a)[rows]
+    length[length == 0] = 1
+    for _ in range(max_depth):
+        mid = (lo + hi) / 2
+        halves = gauss(
+            np.concatenate((lo, mid)), np.concatenate((mid, hi)),
+            np.concatenate((rows, rows)),
+        )
+        left, right = halves[: len(lo)], halves[len(lo):]
+        refined = left + right
+
+        # error target of every interval is split by the width of panels
+        done = np.abs(refined - values) <= tol * np.abs(hi - lo) / length
+        result += np.bincount(rows[done], refined[done], len(a))
+
+        keep = ~done
+        if not keep.any():
+            return result.reshape(shape)
+        lo = np.concatenate((lo[keep], mid[keep]))
+        hi = np.concatenate((mid[keep], hi[keep]))
+        values = np.concatenate((left[keep], right[keep]))
+        rows = np.concatenate((rows[keep], rows[keep]))
+        length = np.concatenate((length[keep], length[keep]))
+
+    # depth limit reached, use the best estimate of remaining panels
+    result += np.bincount(rows, values, len(a))
+    return result.reshape(shape)
+
+
+def downsample(
+    time: NDArray, arr: NDArray, max_points: int, method: str = "minmax"
+) -> tuple[NDArray, NDArray]:
+    """
+    Reduces number of points of a line while keeping its visual shape.
+    NaN values (gaps made by np.where masks) are kept as gaps.
+    Args:
+        time (NDArray): array with space, sorted
+        arr (NDArray): array with values
+        max_points (int): maximal number of returned points (plus gaps)
+        method (str): "minmax" keeps first, last, minimal and maximal point
+            of each of max_points / 4 equally wide buckets, so the envelope
+            stays exactly the same; "lttb" keeps one point per bucket by
+            largest-triangle-three-buckets
+    Returns:
+        tuple[NDArray, NDArray]: downsampled space and values
+    """
+    time = np.asarray(time)
+    arr = np.asarray(arr, dtype=float)
+    if len(arr) <= max_points:
+        return time, arr
+    if method == "minmax":
+        idx = _minmax_indices(time, arr, max(1, max_points // 4))
+    elif method == "lttb":
+        idx = _lttb_indices(time, arr, max_points)
+    else:
+        raise ValueError(f"unknown downsampling method {method}")
+    return time[idx], arr[idx]
+
+
+def _runs(arr: NDArray) -> NDArray:
+    """
+    Numbers runs of NaN and non NaN values, they change at every gap edge.
+    """
+    valid = ~np.isnan(arr)
+    return np.concatenate(([0], np.cumsum(valid[1:] != valid[:-1])))
+
+
+def _minmax_indices(time: NDArray, arr: NDArray, buckets: int) -> NDArray:
+    """
+    Indices of first, last, minimal and maximal point of every bucket,
+    buckets are split at gaps and one NaN is kept per gap and bucket.
+    """
+    width = (time[-1] - time[0]) / buckets or 1.0
+    bucket = np.minimum(((time - time[0]) / width).astype(int), buckets - 1)
+    run = _runs(arr)
+
+    starts = np.flatnonzero(
+        np.concatenate(
+            ([True], (bucket[1:] != bucket[:-1]) | (run[1:] != run[:-1]))
+        )
+    )
+    ends = np.concatenate((starts[1:], [len(arr)])) - 1
+
+    # order of points by value inside every segment
+    segment = np.repeat(
+        np.arange(len(starts)), np.diff(starts, append=len(arr))
+    )
+    order = np.lexsort((np.nan_to_num(arr), segment))
+
+    valid = ~np.isnan(arr[starts])
+    idx = np.concatenate(
+        (
+            starts,
+            ends[valid],
+            order[starts[valid]],
+            order[ends[valid]],
+        )
+    )
+    return np.unique(idx)
+
+
+def _lttb_indices(time: NDArray, arr: NDArray, max_points: int) -> NDArray:
+    """
+    Indices selected by largest-triangle-three-buckets, every run between
+    gaps is downsampled separately and one NaN is kept per gap.
+    """
+    run = _runs(arr)
+    starts = np.flatnonzero(np.concatenate(([True], run[1:] != run[:-1])))
+    ends = np.concatenate((starts[1:], [len(arr)]))
+    n_valid = np.count_nonzero(~np.isnan(arr))
+
+    idx = []
+    for start, end in zip(starts, ends):
+        if np.isnan(arr[start]):
+            idx.append(np.array([start]))
+            continue
+        points = max(3, round(max_points * (end - start) / n_valid))
+        idx.append(start + _lttb(time[start:end], arr[start:end], points))
+    return np.concatenate(idx)
+
+
+def _lttb(time: NDArray, arr: NDArray, points: int) -> NDArray:
+    """
+    Largest-triangle-three-buckets for a line without gaps, keeps the first
+    and the last point and from every bucket in between the one that forms
+    the largest triangle with the previous selected point and the average
+    of the next bucket.
+    """
+    n = len(arr)
+    if points >= n:
+        return np.arange(n)
+
+    edges = np.linspace(1, n - 1, points - 1).astype(int)
+    edges = np.append(edges, n)
+    idx = np.empty(points, dtype=int)
+    idx[0], idx[-1] = 0, n - 1
+    for i in range(points - 2):
+        lo, hi = edges[i], edges[i + 1]
+        next_t = time[hi:edges[i + 2]].mean()
+        next_y = arr[hi:edges[i + 2]].mean()
+        prev = idx[i]
+        area = np.abs(
+            (time[prev] - next_t) * (arr[lo:hi] - arr[prev])
+            - (time[prev] - time[lo:hi]) * (next_y - arr[prev])
+        )
+        idx[i + 1] = lo + np.argmax(area)
+    return idx
+
+
+def plot_line(
+    ax: Axes,
+    time: NDArray,
+    arr: NDArray,
+    max_points: int | None = None,
+    method: str = "minmax",
+    **kwargs,
+) -> List[Line2D]:
+    """
+    Plots a line, optionally downsampled so that render cost does not
+    depend on number of samples.
+    Args:
+        ax (Axes): Axes object from plot
+        time (NDArray): array with space
+        arr (NDArray): array with values
+        max_points (int | None): if set, line is downsampled to this number
+            of points, a few times the axes width in pixels is enough
+        method (str): downsampling method, "minmax" or "lttb"
+        kwargs: arguments passed to Axes.plot
+    Returns:
+        List[Line2D]: list of lines
+    """
+    if max_points is not None:
+        time, arr = downsample(time, arr, max_points, method)
+    return ax.plot(time, arr, **kwargs)
+
+
+# colors of the first curves, the next ones use the default color cycle
+GRAPH_COLORS = ["blue", "orange", "green"]
+
+
+def _graph_data(a: NDArray) -> tuple[NDArray, NDArray, NDArray]:
+    """
+    Evaluates f_a(x) = a^2 * x^3 * sin(x) of all a values on <-3, 3> and
+    their integrals in one broadcast computation.
+    Args:
+        a (NDArray): 1D array of a values
+    Returns:
+        tuple[NDArray, NDArray, NDArray]: space, values with one row per
+            a value and integrals
+    """
+    x = np.linspace(-3, 3, 200)
+    y = a[:, None] ** 2 * (x**3 * np.sin(x))
+    integrals = integrate_many(
+        lambda x, a: a**2 * x**3 * np.sin(x), -3, 3, a
+    )
+    return x, y, integrals
+
+
+def _graph_color(i: int) -> str:
+    return GRAPH_COLORS[i] if i < len(GRAPH_COLORS) else f"C{i % 10}"
+
+
+def _graph_label(val: float) -> str:
+    return f"$Y_{{{float(val)}}}(x)$"
+
+
 def generate_graph(
     a: List[float], show_figure: bool = False, save_path: str | None = None
 ):
@@ -44,13 +333,12 @@ def generate_graph(
     Function for plotting mathematical function:
     f(x) = a^2 * x^3 * sin(x)
     Args:
-        a (List[float]): list of a values
+        a (List[float]): list of a values, any number of them
         show_figure (bool): if True, shows figure
         save_path (str): if set, saves figure to path
     """
-    a = np.array(a).reshape(3, 1)  # convert to NDArray
-    x = np.linspace(-3, 3, 200)
-    y = a**2 * x**3 * np.sin(x)
+    a = np.asarray(a, dtype=float).ravel()  # convert to NDArray
+    x, y, integrals = _graph_data(a)
 
     fig = plt.figure(figsize=(10, 5), frameon=True)
 
@@ -61,17 +349,17 @@ def generate_graph(
     ax.set_xlabel("$x$")
     ax.set_ylabel("$f_a(x)$")
 
-    # plot blue area
-    (line1,) = plot_graph(ax, y[0], x, "blue", "$Y_{1.0}(x)$", 1.0)
-
-    # plot orange area
-    (line2,) = plot_graph(ax, y[1], x, "orange", "$Y_{1.5}(x)$", 1.5)
-
-    # plot green area
-    (line3,) = plot_graph(ax, y[2], x, "green", "$Y_{2.0}(x)$", 2.0)
+    # plot area of every curve
+    lines = []
+    for i, val in enumerate(a):
+        (line,) = plot_graph(
+            ax, y[i], x, _graph_color(i), _graph_label(val), val,
+            integral=integrals[i],
+        )
+        lines.append(line)
 
     ax.legend(
-        handles=[line1, line2, line3],
+        handles=lines,
         bbox_to_anchor=(0.5, 1.15),
         loc="upper center",
         ncol=3,
@@ -82,8 +370,102 @@ def generate_graph(
         plt.savefig(save_path, dpi=300)
 
 
+def generate_graph_sweep(
+    a: NDArray | List[float],
+    save_path: str,
+    rows: int = 4,
+    cols: int = 4,
+    dpi: int = 100,
+) -> int:
+    """
+    Function for plotting f(x) = a^2 * x^3 * sin(x) of a large sweep of a
+    values, one curve per subplot of a rows x cols grid. Curves are
+    computed page by page and one figure is reused for all pages, so
+    memory does not grow with number of a values.
+    Args:
+        a (NDArray | List[float]): a values
+        save_path (str): multipage PDF if it ends with .pdf, otherwise
+            every page is saved as its own image {name}_{page}{ext} (or
+            save_path if there is only one page)
+        rows (int): number of rows of the grid on a page
+        cols (int): number of columns of the grid on a page
+        dpi (int): resolution of saved pages
+    Returns:
+        int: number of pages
+    """
+    a = np.asarray(a, dtype=float).ravel()
+    per_page = rows * cols
+    pages = max(1, -(-len(a) // per_page))
+
+    # fixed layout, constrained layout would draw every page twice
+    fig, axes = plt.subplots(
+        rows, cols, figsize=(4 * cols, 2.5 * rows), squeeze=False
+    )
+    fig.subplots_adjust(0.05, 0.05, 0.98, 0.95, 0.25, 0.45)
+    axes = axes.ravel()
+
+    pdf = None
+    if save_path.lower().endswith(".pdf"):
+        pdf = PdfPages(save_path)
+    root, ext = os.path.splitext(save_path)
+
+    # artists are created once and only updated for every page, clearing
+    # the axes would rebuild ticks of every subplot
+    x = np.linspace(-3, 3, 200)
+    lines, fills = [], [None] * len(axes)
+    for i, ax in enumerate(axes):
+        ax.set_xlim(-3, 5)
+        ax.xaxis.set_ticks(np.arange(-3, 4))
+        (line,) = plot_line(ax, x, np.zeros_like(x), color=_graph_color(i))
+        lines.append(line)
+
+    try:
+        for page in range(pages):
+            page_a = a[page * per_page:(page + 1) * per_page]
+            x, y, integrals = _graph_data(page_a)
+
+            for i, ax in enumerate(axes):
+                ax.set_visible(i < len(page_a))
+                if i >= len(page_a):
+                    continue
+
+                # plain text title, unique mathtext of every curve would
+                # be parsed again for every subplot
+                ax.set_title(
+                    f"a = {page_a[i]:g}, integral = {integrals[i]:.2f}",
+                    fontsize=9,
+                )
+                ax.set_ylim(0, max(y[i].max(), 1e-12) * 1.15)
+                lines[i].set_ydata(y[i])
+                if fills[i] is not None:
+                    fills[i].remove()
+                fills[i] = ax.fill_between(
+                    x=x, y1=y[i], color=_graph_color(i), alpha=0.1
+                )
+
+            if pdf is not None:
+                pdf.savefig(fig, dpi=dpi)
+            elif pages > 1:
+                fig.savefig(f"{root}_{page + 1:04d}{ext}", dpi=dpi)
+            else:
+                fig.savefig(save_path, dpi=dpi)
+    finally:
+        if pdf is not None:
+            pdf.close()
+        plt.close(fig)
+
+    return pages
+
+
 def plot_graph(
-    ax: Axes, arr: NDArray, time: NDArray, color: str, label: str, val: float
+    ax: Axes,
+    arr: NDArray,
+    time: NDArray,
+    color: str,
+    label: str,
+    val: float,
+    max_points: int | None = None,
+    integral: float | None = None,
 ) -> [Line2D]:
     """
     Helper function for generating graphs
@@ -93,16 +475,27 @@ def plot_graph(
         time (NDArray): array with space
         color (string): color of plot
         label (string): label for plot
+        max_points (int | None): if set, line and area are downsampled
+        integral (float | None): integral of the curve for the label,
+            computed by trapezoidal rule from samples if not given
     Returns:
         [Line2D]: list of lines
     """
+    # integral is computed from all samples, only drawing is downsampled
+    if integral is None:
+        integral = np.trapz(arr, time)
+    integral = round(integral, 2)
+    end = arr[-1]
+    if max_points is not None:
+        time, arr = downsample(time, arr, max_points)
+
     lines = ax.plot(time, arr, label=label)
     ax.fill_between(x=time, y1=arr, color=color, alpha=0.1)
     ax.text(
         3,
-        arr[-1],
+        end,
         "$\\int f_{{{value}}}(x)dx = {int}$".format(
-            value=val, int=round(np.trapz(arr, time), 2)
+            value=val, int=integral
         ),
         fontsize=12,
         ha="left",
@@ -112,7 +505,12 @@ def plot_graph(
     return lines
 
 
-def generate_sinus(show_figure: bool = False, save_path: str | None = None):
+def generate_sinus(
+    show_figure: bool = False,
+    save_path: str | None = None,
+    max_points: int | None = None,
+    method: str = "minmax",
+):
     """
     Generates 3 sinus plots of 3 functions:
     f1 = 0.5 * cos(1/50*pi*t),
@@ -121,6 +519,9 @@ def generate_sinus(show_figure: bool = False, save_path: str | None = None):
     Args:
         show_figure (bool): if True, shows figure
         save_path (str): if set, saves figure to path
+        max_points (int | None): if set, every line is downsampled to this
+            number of points
+        method (str): downsampling method, "minmax" or "lttb"
     """
     time = np.linspace(0, 100, 20000)
     f1 = 0.5 * np.cos(1 / 50 * np.pi * time)
@@ -136,18 +537,24 @@ def generate_sinus(show_figure: bool = False, save_path: str | None = None):
     (ax1, ax2, ax3) = axes
 
     # plot first sinus
-    plot_sinus(ax1, "$f_1(t)$", f1, time)
+    plot_sinus(ax1, "$f_1(t)$", f1, time, None, max_points, method)
 
     # plot second sinus
-    plot_sinus(ax2, "$f_2(t)$", f2, time)
+    plot_sinus(ax2, "$f_2(t)$", f2, time, None, max_points, method)
 
-    # plot green part of third sinus
+    # plot green part of third sinus, masked parts are downsampled as gaps
     green_line = np.where(f3 >= f1, f3, np.nan)
-    plot_sinus(ax3, "$f_1(t) + f_2(t)$", green_line, time, color="green")
+    plot_sinus(
+        ax3, "$f_1(t) + f_2(t)$", green_line, time, "green", max_points,
+        method
+    )
 
     # plot red part of third sinus
     red_line = np.where(f3 <= f1, f3, np.nan)
-    ax3.plot(time, red_line, label="$f_3(t)$", color="red")
+    plot_line(
+        ax3, time, red_line, max_points, method, label="$f_3(t)$",
+        color="red"
+    )
 
     if show_figure:
         plt.show()
@@ -157,7 +564,13 @@ def generate_sinus(show_figure: bool = False, save_path: str | None = None):
 
 
 def plot_sinus(
-    ax: Axes, label: str, arr: NDArray, time: NDArray, color: str | None = None
+    ax: Axes,
+    label: str,
+    arr: NDArray,
+    time: NDArray,
+    color: str | None = None,
+    max_points: int | None = None,
+    method: str = "minmax",
 ):
     """
     Helper function for generating sinus plots
@@ -168,25 +581,136 @@ def plot_sinus(
         arr (NDArray): array with values
         time (NDArray): array with space
         color (string | None): color of plot, default None
+        max_points (int | None): if set, line is downsampled to this number
+            of points
+        method (str): downsampling method, "minmax" or "lttb"
     """
     ax.set_xlim(0, 100)
     ax.set_ylim(-0.8, 0.8)
     ax.set_yticks([-0.8, -0.4, 0, 0.4, 0.8])
     ax.set_xlabel("$t$")
     ax.set_ylabel(label)
-    ax.plot(time, arr, label=label, color=color)
+    plot_line(ax, time, arr, max_points, method, label=label, color=color)
+
+
+# page with the table of stations parsed by download_data
+DATA_URL = "https://ehw.fit.vutbr.cz/izv/st_zemepis_cz.html"
+
 
+_TABLE_TAG_RE = re.compile(r"<(/?)table\b[^>]*>", re.I)
+_ROW_RE = re.compile(r"<tr\b[^>]*>(.*?)(?=<tr\b|</table|$)", re.I | re.S)
+_CELL_RE = re.compile(r"<td\b[^>]*>(.*?)(?:</td\s*>|(?=<td\b)|$)", re.I | re.S)
+_TAG_RE = re.compile(r"<[^>]*>")
 
-def download_data() -> List[Dict[str, Any]]:
+
+def _find_tables(html_text: str) -> List[str]:
     """
-    Downloads data from https://ehw.fit.vutbr.cz/izv/st_zemepis_cz.html
-    and get data from the table
+    Finds contents of all tables, in order of their start tags like
+    BeautifulSoup's find_all("table"), nested tables are paired by a stack
+    Args:
+        html_text (str): html page
+    Returns:
+        List[str]: html inside of every table
+    """
+    tables = []
+    open_tables = []  # (index in tables, start of content)
+    for match in _TABLE_TAG_RE.finditer(html_text):
+        if not match.group(1):
+            tables.append("")
+            open_tables.append((len(tables) - 1, match.end()))
+        elif open_tables:
+            index, start = open_tables.pop()
+            tables[index] = html_text[start:match.start()]
+
+    # tables which are not closed end with the page
+    for index, start in open_tables:
+        tables[index] = html_text[start:]
+    return tables
+
+
+def parse_table_columns(html_text: str) -> NDArray:
+    """
+    Fast parser of the table of stations, html is split by regular
+    expressions and numbers are converted column by column
+    Args:
+        html_text (str): html page
+    Returns:
+        NDArray: structured array with position, lat, long and height
+    """
+    table = _find_tables(html_text)[1]
+    rows = _ROW_RE.findall(table)[1:]  # skip header
+
+    cells = []
+    for row in rows:
+        row_cells = _CELL_RE.findall(row)
+        cells.append([row_cells[i] for i in (0, 2, 4, 6)])
+    columns = np.array(cells, dtype=object).reshape(-1, 4).T
+
+    # text of cells without nested tags and entities, like in BeautifulSoup
+    position, lat, long, height = (
+        [html.unescape(_TAG_RE.sub("", cell)) for cell in column]
+        for column in columns
+    )
+
+    def to_float(column: List[str]) -> NDArray:
+        column = np.array(column, dtype=str)
+        column = np.char.replace(column, "\xa0", "")
+        return np.char.replace(column, ",", ".").astype(float)
+
+    data = np.empty(
+        len(rows),
+        dtype=[
+            ("position", np.array(position, dtype=str).dtype),
+            ("lat", float),
+            ("long", float),
+            ("height", float),
+        ],
+    )
+    data["position"] = position
+    # lat and long end with degree sign
+    data["lat"] = to_float([cell[:-1] for cell in lat])
+    data["long"] = to_float([cell[:-1] for cell in long])
+    data["height"] = to_float(height)
+    return data
+
+
+def table_to_records(data: NDArray) -> List[Dict[str, Any]]:
+    """
+    Converts structured array from parse_table_columns to list of
+    dictionaries returned by parse_table_row
+    Args:
+        data (NDArray): structured array with stations
+    Returns:
+        List[Dict[str, Any]]: list of dictionaries with parsed data
+    """
+    return [
+        {
+            "position": str(position),
+            "lat": float(lat),
+            "long": float(long),
+            "height": float(height),
+        }
+        for position, lat, long, height in data.tolist()
+    ]
+
+
+def parse_table(
+    html_text: str, parser: str = "bs4"
+) -> List[Dict[str, Any]]:
+    """
+    Parses the table of stations from html page
+    Args:
+        html_text (str): html page
+        parser (str): "bs4" parses rows by BeautifulSoup, "fast" uses
+            parse_table_columns and converts its result
     Returns:
         List[Dict[str, Any]]: list of dictionaries with parsed data
     """
-    html = requests.get("https://ehw.fit.vutbr.cz/izv/st_zemepis_cz.html")
-    html.encoding = "utf-8"  # set encoding to utf-8
-    html_text = html.text
+    if parser == "fast":
+        return table_to_records(parse_table_columns(html_text))
+    if parser != "bs4":
+        raise ValueError(f"unknown parser {parser}")
+
     soup = BeautifulSoup(html_text, "html.parser")
 
     table = soup.find_all("table")[1]
@@ -200,6 +724,135 @@ def download_data() -> List[Dict[str, Any]]:
     return data
 
 
+def _cache_path(cache_dir: str, url: str) -> str:
+    """
+    Path of the cached response of url
+    """
+    name = hashlib.sha1(url.encode("utf-8")).hexdigest()
+    return os.path.join(cache_dir, f"{name}.json")
+
+
+def _fetch_table(
+    session: requests.Session,
+    url: str,
+    cache_dir: str | None,
+    timeout: float,
+    parser: str = "bs4",
+) -> List[Dict[str, Any]]:
+    """
+    Downloads and parses one page, a page cached with ETag or Last-Modified
+    is requested conditionally and reused without parsing when unchanged
+    """
+    cached = None
+    headers = {}
+    if cache_dir is not None:
+        try:
+            with open(_cache_path(cache_dir, url), encoding="utf-8") as f:
+                cached = json.load(f)
+        except (OSError, ValueError):
+            cached = None
+    if cached is not None:
+        if cached.get("etag"):
+            headers["If-None-Match"] = cached["etag"]
+        if cached.get("last_modified"):
+            headers["If-Modified-Since"] = cached["last_modified"]
+
+    response = session.get(url, headers=headers, timeout=timeout)
+    if response.status_code == 304 and cached is not None:
+        return cached["data"]
+    response.raise_for_status()
+
+    response.encoding = "utf-8"  # set encoding to utf-8
+    data = parse_table(response.text, parser)
+
+    etag = response.headers.get("ETag")
+    last_modified = response.headers.get("Last-Modified")
+    if cache_dir is not None and (etag or last_modified):
+        os.makedirs(cache_dir, exist_ok=True)
+        path = _cache_path(cache_dir, url)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "url": url,
+                    "etag": etag,
+                    "last_modified": last_modified,
+                    "data": data,
+                },
+                f,
+            )
+        os.replace(tmp_path, path)
+
+    return data
+
+
+def download_tables(
+    urls: List[str],
+    cache_dir: str | None = None,
+    workers: int = 8,
+    timeout: float = 10,
+    session: requests.Session | None = None,
+    parser: str = "bs4",
+) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Downloads and parses tables of many pages concurrently through one
+    pooled session
+    Args:
+        urls (List[str]): pages with tables
+        cache_dir (str | None): if set, responses are cached on disk and
+            requested again with If-None-Match / If-Modified-Since
+        workers (int): number of concurrent downloads
+        timeout (float): timeout of every request in seconds
+        session (requests.Session | None): session to use, a new pooled
+            session is created if not set
+        parser (str): parser of tables, "bs4" or "fast"
+    Returns:
+        Dict[str, List[Dict[str, Any]]]: parsed data of every url
+    """
+    own_session = session is None
+    if own_session:
+        session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(
+            pool_connections=workers, pool_maxsize=workers
+        )
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            results = executor.map(
+                lambda url: _fetch_table(
+                    session, url, cache_dir, timeout, parser
+                ),
+                urls,
+            )
+            return dict(zip(urls, results))
+    finally:
+        if own_session:
+            session.close()
+
+
+def download_data(
+    url: str = DATA_URL,
+    cache_dir: str | None = None,
+    timeout: float = 10,
+    parser: str = "bs4",
+) -> List[Dict[str, Any]]:
+    """
+    Downloads data from https://ehw.fit.vutbr.cz/izv/st_zemepis_cz.html
+    and get data from the table
+    Args:
+        url (str): page with the table, default DATA_URL
+        cache_dir (str | None): if set, unchanged page is not downloaded
+            and parsed again
+        timeout (float): timeout of the request in seconds
+        parser (str): parser of the table, "bs4" or "fast"
+    Returns:
+        List[Dict[str, Any]]: list of dictionaries with parsed data
+    """
+    return download_tables([url], cache_dir, 1, timeout, parser=parser)[url]
+
+
 def parse_table_row(row: BeautifulSoup) -> Dict[str, Any]:
     """
     Parses row from table and returns dictionary with data
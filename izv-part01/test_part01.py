@@ -10,6 +10,9 @@ nebo
 import part01
 import os
 import pytest
+import numpy as np
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 
 
 def test_integrate():
@@ -22,6 +25,24 @@ def test_integrate():
     assert r == pytest.approx(7)
 
 
+def test_integrate_many():
+    """Test davkoveho vypoctu integralu"""
+
+    def f(x, a):
+        return a * (10 * x + 2)
+
+    a = np.array([1.0, 2.0, 3.0])
+    for method in ["simpson", "gauss", "adaptive"]:
+        r = part01.integrate_many(f, 0, 1, a, method=method)
+        assert r == pytest.approx(7 * a)
+
+    r = part01.integrate_many(np.sin, [0, 0], [np.pi, 2 * np.pi])
+    assert r == pytest.approx([2, 0], abs=1e-12)
+
+    r = part01.integrate_many(np.exp, 0, 1, method="adaptive", tol=1e-12)
+    assert r == pytest.approx(np.e - 1, abs=1e-12)
+
+
 def test_generate_fn():
     """Test generovani grafu s vice funkcemi"""
     part01.generate_graph([1.0, 1.5, 2.0], show_figure=False, save_path="tmp_fn.png")
@@ -43,3 +64,164 @@ def test_download():
     assert data[0]["lat"] == pytest.approx(50.0683)
     assert data[0]["long"] == pytest.approx(12.3913)
     assert data[0]["height"] == pytest.approx(483.0)
+
+
+def test_downsample_minmax():
+    """Test zachovani obalky pri decimaci min/max"""
+    t = np.linspace(0, 100, 20000)
+    y = np.sin(np.pi * t) + 0.1 * t
+    y[5000:6000] = np.nan
+
+    ts, ys = part01.downsample(t, y, 400)
+    assert len(ts) <= 400 + 10
+    assert np.nanmin(ys) == np.nanmin(y)
+    assert np.nanmax(ys) == np.nanmax(y)
+    # gap made by NaN values stays a gap
+    gap = (ts > 25.1) & (ts < 29.9)
+    assert gap.any() and np.isnan(ys[gap]).all()
+    assert np.all(np.diff(ts) > 0)
+
+
+def test_downsample_lttb():
+    """Test decimace metodou largest-triangle-three-buckets"""
+    t = np.linspace(0, 10, 5000)
+    y = np.where(t > 5, np.nan, np.cos(t))
+
+    ts, ys = part01.downsample(t, y, 100, method="lttb")
+    assert len(ts) <= 100 + 5
+    assert ts[0] == t[0]
+    assert np.isnan(ys[-1])
+    assert np.all(np.isin(ts, t))
+
+
+def test_generate_sin_downsampled(tmp_path):
+    """Test generovani grafu se sinusovkami s decimaci"""
+    png = tmp_path / "sin.png"
+    part01.generate_sinus(
+        show_figure=False, save_path=str(png), max_points=2000
+    )
+    assert png.exists()
+
+
+def test_generate_fn_many(tmp_path):
+    """Test generovani grafu s libovolnym poctem funkci"""
+    png = tmp_path / "fn.png"
+    part01.generate_graph(
+        [0.5, 1.0, 1.5, 2.0, 2.5], show_figure=False, save_path=str(png)
+    )
+    assert png.exists()
+
+
+def test_generate_fn_sweep(tmp_path):
+    """Test vykresleni velkeho mnozstvi funkci do vicestrankoveho PDF"""
+    pdf = tmp_path / "sweep.pdf"
+    pages = part01.generate_graph_sweep(
+        np.linspace(0.5, 2.0, 10), str(pdf), rows=2, cols=2
+    )
+    assert pages == 3
+    assert pdf.exists()
+
+
+def make_page(stations, nested=False):
+    """Vytvori stranku s tabulkou stanic ve formatu puvodni stranky"""
+    rows = "".join(
+        f"<tr><td>{name}</td><td></td><td>{lat:.4f}°</td><td></td>"
+        f"<td>{long:.4f}°</td><td></td><td>{height:,.1f}</td></tr>".replace(
+            ",", "\xa0"
+        ).replace(".", ",")
+        for name, lat, long, height in stations
+    )
+    table = "<table><tr><th>Stanice</th></tr>" + rows + "</table>"
+    if nested:
+        # tabulka stanic uvnitr layoutove tabulky
+        return (
+            "<html><body><table><tr><td>" + table + "</td></tr>"
+            "<tr><td>paticka</td></tr></table></body></html>"
+        )
+    return (
+        "<html><body><table><tr><td>menu</td></tr></table>"
+        + table + "</body></html>"
+    )
+
+
+@pytest.fixture
+def server():
+    """Lokalni HTTP server se strankami s ETag"""
+    pages = {
+        "/a.html": make_page([("Cheb", 50.0683, 12.3913, 483.0)]),
+        "/b.html": make_page([("Brno", 49.1530, 16.6888, 1241.5)]),
+    }
+    requests_log = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            etag = f'"{hash(pages[self.path])}"'
+            if self.headers.get("If-None-Match") == etag:
+                requests_log.append((self.path, 304))
+                self.send_response(304)
+                self.end_headers()
+                return
+            requests_log.append((self.path, 200))
+            body = pages[self.path].encode("utf-8")
+            self.send_response(200)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_port}", pages, requests_log
+    httpd.shutdown()
+
+
+def test_download_tables_cache(server, tmp_path, monkeypatch):
+    """Test soubezneho stahovani s podminenymi pozadavky"""
+    base, pages, log = server
+    urls = [f"{base}/a.html", f"{base}/b.html"]
+
+    data = part01.download_tables(urls, cache_dir=str(tmp_path))
+    assert data[urls[0]][0]["position"] == "Cheb"
+    assert data[urls[0]][0]["lat"] == pytest.approx(50.0683)
+    assert data[urls[1]][0]["height"] == pytest.approx(1241.5)
+
+    # unchanged pages are answered by 304 and are not parsed again
+    def fail(html_text, parser="bs4"):
+        raise AssertionError("unchanged page parsed")
+
+    monkeypatch.setattr(part01, "parse_table", fail)
+    assert part01.download_tables(urls, cache_dir=str(tmp_path)) == data
+    assert sorted(status for _, status in log) == [200, 200, 304, 304]
+
+    monkeypatch.undo()
+    pages["/a.html"] = make_page([("Praha", 50.0, 14.4, 200.0)])
+    data = part01.download_data(urls[0], cache_dir=str(tmp_path))
+    assert data[0]["position"] == "Praha"
+
+
+def test_parse_table_fast():
+    """Test rychleho sloupcoveho parseru tabulky"""
+    page = make_page(
+        [
+            ("Cheb", 50.0683, 12.3913, 483.0),
+            ("<b>Brno</b> &amp; okoli", 49.153, 16.6888, 1241.5),
+        ]
+    )
+    columns = part01.parse_table_columns(page)
+    assert list(columns["position"]) == ["Cheb", "Brno & okoli"]
+    assert columns["height"] == pytest.approx([483.0, 1241.5])
+    assert part01.parse_table(page, "fast") == part01.parse_table(page)
+
+
+def test_parse_table_fast_nested():
+    """Test rychleho parseru s tabulkou stanic uvnitr jine tabulky"""
+    page = make_page(
+        [("Cheb", 50.0683, 12.3913, 483.0), ("Brno", 49.153, 16.6888, 241.5)],
+        nested=True,
+    )
+    assert len(part01.parse_table(page)) == 2
+    assert part01.parse_table(page, "fast") == part01.parse_table(page)
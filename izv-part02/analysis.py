@@ -6,121 +6,557 @@
 
 from matplotlib import pyplot as plt
 import pandas as pd
+import numpy as np
 import seaborn as sns
 import zipfile
 import io
+import math
+import os
+import hashlib
+import json
+import re
+import shutil
+import struct
+import tempfile
+from collections import deque
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor
 import matplotlib.dates as mdates
+from typing import Dict, Iterator, List, Tuple
 
-# Ukol 1: nacteni dat ze ZIP souboru
+from izvcache import (
+    atomic_file,
+    data_cache_file,
+    figure_key,
+    load_figure,
+    read_frame,
+    store_figure,
+    write_frame,
+)
 
+from dedup import DedupIndex
 
-def load_data(filename: str) -> pd.DataFrame:
-    headers = [
-        "p1",
-        "p36",
-        "p37",
-        "p2a",
-        "weekday(p2a)",
-        "p2b",
-        "p6",
-        "p7",
-        "p8",
-        "p9",
-        "p10",
-        "p11",
-        "p12",
-        "p13a",
-        "p13b",
-        "p13c",
-        "p14",
-        "p15",
-        "p16",
-        "p17",
-        "p18",
-        "p19",
-        "p20",
-        "p21",
-        "p22",
-        "p23",
-        "p24",
-        "p27",
-        "p28",
-        "p34",
-        "p35",
-        "p39",
-        "p44",
-        "p45a",
-        "p47",
-        "p48a",
-        "p49",
-        "p50a",
-        "p50b",
-        "p51",
-        "p52",
-        "p53",
-        "p55a",
-        "p57",
-        "p58",
-        "a",
-        "b",
-        "d",
-        "e",
-        "f",
-        "g",
-        "h",
-        "i",
-        "j",
-        "k",
-        "l",
-        "n",
-        "o",
-        "p",
-        "q",
-        "r",
-        "s",
-        "t",
-        "p5a",
-    ]
+# Ukol 1: nacteni dat ze ZIP souboru
 
-    regions = {
-        "PHA": "00",
-        "STC": "01",
-        "JHC": "02",
-        "PLK": "03",
-        "ULK": "04",
-        "HKK": "05",
-        "JHM": "06",
-        "MSK": "07",
-        "OLK": "14",
-        "ZLK": "15",
-        "VYS": "16",
-        "PAK": "17",
-        "LBK": "18",
-        "KVK": "19",
-    }
+# bump whenever load_data or parse_data output changes, invalidates cache
+PARSER_VERSION = 3
+
+HEADERS = [
+    "p1",
+    "p36",
+    "p37",
+    "p2a",
+    "weekday(p2a)",
+    "p2b",
+    "p6",
+    "p7",
+    "p8",
+    "p9",
+    "p10",
+    "p11",
+    "p12",
+    "p13a",
+    "p13b",
+    "p13c",
+    "p14",
+    "p15",
+    "p16",
+    "p17",
+    "p18",
+    "p19",
+    "p20",
+    "p21",
+    "p22",
+    "p23",
+    "p24",
+    "p27",
+    "p28",
+    "p34",
+    "p35",
+    "p39",
+    "p44",
+    "p45a",
+    "p47",
+    "p48a",
+    "p49",
+    "p50a",
+    "p50b",
+    "p51",
+    "p52",
+    "p53",
+    "p55a",
+    "p57",
+    "p58",
+    "a",
+    "b",
+    "d",
+    "e",
+    "f",
+    "g",
+    "h",
+    "i",
+    "j",
+    "k",
+    "l",
+    "n",
+    "o",
+    "p",
+    "q",
+    "r",
+    "s",
+    "t",
+    "p5a",
+]
+
+REGIONS = {
+    "PHA": "00",
+    "STC": "01",
+    "JHC": "02",
+    "PLK": "03",
+    "ULK": "04",
+    "HKK": "05",
+    "JHM": "06",
+    "MSK": "07",
+    "OLK": "14",
+    "ZLK": "15",
+    "VYS": "16",
+    "PAK": "17",
+    "LBK": "18",
+    "KVK": "19",
+}
+
+CATEGORY_COLS = ["p47", "h", "i", "k", "l", "p", "q", "t"]
+FLOAT_COLS = ["a", "b", "d", "e", "f", "g", "n", "o"]
+
+
+class _StoredMember(io.RawIOBase):
+    # seekable read-only view of an uncompressed member of the outer zip,
+    # reads go straight to the archive file so nothing is buffered
+
+    def __init__(self, filename: str, info: zipfile.ZipInfo):
+        super().__init__()
+        self._file = open(filename, "rb")
+
+        # data start right after the local header and its variable fields
+        self._file.seek(info.header_offset)
+        header = self._file.read(zipfile.sizeFileHeader)
+        name_len, extra_len = struct.unpack("<HH", header[26:30])
+        self._start = (
+            info.header_offset + zipfile.sizeFileHeader + name_len + extra_len
+        )
+        self._size = info.file_size
+        self._pos = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._pos
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_SET:
+            pos = offset
+        elif whence == io.SEEK_CUR:
+            pos = self._pos + offset
+        elif whence == io.SEEK_END:
+            pos = self._size + offset
+        else:
+            raise ValueError(f"invalid whence ({whence})")
+
+        if pos < 0:
+            raise ValueError(f"negative seek position {pos}")
+        self._pos = pos
+        return self._pos
+
+    def readinto(self, buffer) -> int:
+        size = min(len(buffer), self._size - self._pos)
+        if size <= 0:
+            return 0
+
+        self._file.seek(self._start + self._pos)
+        size = self._file.readinto(memoryview(buffer)[:size])
+        self._pos += size
+        return size
+
+    def close(self):
+        self._file.close()
+        super().close()
+
+
+@contextmanager
+def _open_year_archive(
+        data: zipfile.ZipFile, filename: str, year_file: str
+) -> Iterator[zipfile.ZipFile]:
+    # opens inner yearly zip without reading it whole into memory, stored
+    # members are read in place, compressed ones need seeking which zip
+    # streams do by decompressing again, so they are spilled to disk
+    info = data.getinfo(year_file)
+    if info.compress_type == zipfile.ZIP_STORED:
+        stream = _StoredMember(filename, info)
+    else:
+        stream = tempfile.TemporaryFile()
+        with data.open(info, "r") as year:
+            shutil.copyfileobj(year, stream, 1 << 20)
+        stream.seek(0)
+
+    try:
+        with zipfile.ZipFile(stream) as zip:
+            yield zip
+    finally:
+        stream.close()
+
+
+def _read_region_csv(
+        zip: zipfile.ZipFile,
+        region_name: str,
+        region_code: str,
+        typed: bool = False,
+        usecols: List[str] = None,
+) -> pd.DataFrame:
+    # inner csv file
+    with zip.open(f"{region_code}.csv", "r") as csv_file:
+        if typed:
+            # final dtypes are applied directly by the csv parser
+            df = pd.read_csv(
+                csv_file,
+                sep=";",
+                names=HEADERS,
+                usecols=usecols,
+                encoding="cp1250",
+                low_memory=False,
+                decimal=",",
+                dtype={
+                    col: "category"
+                    for col in CATEGORY_COLS
+                    if usecols is None or col in usecols
+                },
+            )
+        else:
+            # category columns are read as strings in every region csv,
+            # one with only numbers would be inferred as int ("01" becomes
+            # 1) and give other categories than the typed path
+            df = pd.read_csv(
+                csv_file,
+                sep=";",
+                names=HEADERS,
+                usecols=usecols,
+                encoding="cp1250",
+                low_memory=False,
+                dtype={
+                    col: str
+                    for col in CATEGORY_COLS
+                    if usecols is None or col in usecols
+                },
+            )
+    df["region"] = region_name
+
+    if typed:
+        if "p2a" in df:
+            df["date"] = pd.to_datetime(df["p2a"], format="%Y-%m-%d")
+            df.drop(columns=["p2a"], inplace=True)
+
+        # only columns with values the parser could not convert are left
+        # as object, retype them the same way as parse_data does (a single
+        # bad value leaves comma decimals of the whole column as strings)
+        for col in df.columns:
+            if col != "region" and df[col].dtype == object:
+                if col in FLOAT_COLS:
+                    df[col] = df[col].str.replace(",", ".")
+                df[col] = pd.to_numeric(df[col], errors="coerce")
+
+    return df
+
+
+def _load_region_job(
+        filename: str,
+        year_file: str,
+        region_name: str,
+        region_code: str,
+        typed: bool = False,
+        usecols: List[str] = None,
+        spilled: str = None,
+) -> pd.DataFrame:
+    # single (year, region) job for the process pool, every worker opens
+    # the archive on its own so only file names have to be pickled,
+    # compressed yearly archives were already spilled to disk by the parent
+    if spilled is not None:
+        with zipfile.ZipFile(spilled, "r") as zip:
+            return _read_region_csv(
+                zip, region_name, region_code, typed, usecols
+            )
 
-    final_df = pd.DataFrame()
+    with zipfile.ZipFile(filename, "r") as data:
+        with _open_year_archive(data, filename, year_file) as zip:
+            return _read_region_csv(
+                zip, region_name, region_code, typed, usecols
+            )
+
+
+def _spill_year_archive(
+        data: zipfile.ZipFile, year_file: str, tmp_dir: str, index: int
+) -> str:
+    # compressed yearly archive is inflated once into tmp_dir and shared by
+    # all region jobs of the year, stored ones are read in place (None)
+    info = data.getinfo(year_file)
+    if info.compress_type == zipfile.ZIP_STORED:
+        return None
+
+    spilled = os.path.join(tmp_dir, f"{index}.zip")
+    with data.open(info, "r") as year, open(spilled, "wb") as f:
+        shutil.copyfileobj(year, f, 1 << 20)
+    return spilled
+
+
+def _region_jobs(
+        filename: str,
+        year_files: List[str],
+        regions: Dict[str, str],
+        tmp_dir: str,
+) -> Iterator[Tuple[str, str, str, str, bool]]:
+    # (year_file, region_name, region_code, spilled, last in year) of every
+    # job, yearly archive is spilled right before its first job is submitted
+    with zipfile.ZipFile(filename, "r") as data:
+        for index, year_file in enumerate(year_files):
+            spilled = _spill_year_archive(data, year_file, tmp_dir, index)
+            for position, (region_name, region_code) in enumerate(
+                regions.items()
+            ):
+                last = position == len(regions) - 1
+                yield year_file, region_name, region_code, spilled, last
+
+
+def _pop_result(pending: deque) -> Tuple[str, str, pd.DataFrame]:
+    year_name, region_name, future, spilled = pending.popleft()
+    df = future.result()
+    if spilled is not None:
+        # results come in order, so all jobs of the year are done
+        os.remove(spilled)
+    return year_name, region_name, df
+
+
+def _year_name(year_file: str) -> str:
+    return os.path.splitext(os.path.basename(year_file))[0]
+
+
+def _year_of(year_file: str) -> str:
+    # year of inner archive is the last four digit number in its name
+    years = re.findall(r"\d{4}", _year_name(year_file))
+    return years[-1] if years else _year_name(year_file)
+
+
+def _load_data_iter_parallel(
+        filename: str,
+        year_files: List[str],
+        regions: Dict[str, str],
+        workers: int,
+        typed: bool,
+        usecols: List[str],
+) -> Iterator[Tuple[str, str, pd.DataFrame]]:
+    # keep only a bounded window of jobs in flight, results are yielded
+    # in the same order as the serial loader, temporary directory has to
+    # outlive the pool whose jobs read the spilled archives
+    pending = deque()
+    with tempfile.TemporaryDirectory(prefix="izv_years_") as tmp_dir:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            jobs = _region_jobs(filename, year_files, regions, tmp_dir)
+            for year_file, region_name, region_code, spilled, last in jobs:
+                pending.append((
+                    _year_name(year_file),
+                    region_name,
+                    executor.submit(
+                        _load_region_job,
+                        filename,
+                        year_file,
+                        region_name,
+                        region_code,
+                        typed,
+                        usecols,
+                        spilled,
+                    ),
+                    # last job of the year removes the spilled archive
+                    spilled if last else None,
+                ))
+                if len(pending) >= 2 * workers:
+                    yield _pop_result(pending)
+
+            while pending:
+                yield _pop_result(pending)
+
+
+def _load_year_files(
+        filename: str,
+        year_files: List[str] = None,
+        workers: int = None,
+        typed: bool = False,
+        regions: Dict[str, str] = None,
+        usecols: List[str] = None,
+) -> Iterator[Tuple[str, str, pd.DataFrame]]:
+    # loads only given inner yearly archives and regions, all if None
+    if year_files is None:
+        with zipfile.ZipFile(filename, "r") as data:
+            year_files = data.namelist()
+    if regions is None:
+        regions = REGIONS
+
+    if workers is not None and workers > 1:
+        yield from _load_data_iter_parallel(
+            filename, year_files, regions, workers, typed, usecols
+        )
+        return
 
     # outer zip file
     with zipfile.ZipFile(filename, "r") as data:
-        for zipfiles in data.namelist():
+        for zipfiles in year_files:
+            year_name = _year_name(zipfiles)
             # inner zip file
-            with data.open(zipfiles, "r") as year:
-                with zipfile.ZipFile(io.BytesIO(year.read())) as zip:
-                    # inner csv file
-                    for region_name, region_code in regions.items():
-                        with zip.open(f"{region_code}.csv", "r") as csv_file:
-                            df = pd.read_csv(
-                                csv_file,
-                                sep=";",
-                                names=headers,
-                                encoding="cp1250",
-                                low_memory=False,
-                            )
-                            df["region"] = region_name
-                            final_df = pd.concat(
-                                [final_df, df], ignore_index=True
-                            )
+            with _open_year_archive(data, filename, zipfiles) as zip:
+                for region_name, region_code in regions.items():
+                    df = _read_region_csv(
+                        zip, region_name, region_code, typed, usecols
+                    )
+                    yield year_name, region_name, df
+
+
+def _select(
+        filename: str,
+        columns: List[str] = None,
+        regions: List[str] = None,
+        years: List[int] = None,
+) -> Tuple[List[str], Dict[str, str], List[str]]:
+    # translates user filters to yearly archives, region csv files and csv
+    # columns which have to be read, None means everything
+    year_files = None
+    if years is not None:
+        wanted_years = {str(year) for year in years}
+        with zipfile.ZipFile(filename, "r") as data:
+            year_files = [
+                year_file
+                for year_file in data.namelist()
+                if _year_of(year_file) in wanted_years
+            ]
+
+    selected_regions = None
+    if regions is not None:
+        unknown = set(regions) - set(REGIONS)
+        if unknown:
+            raise ValueError(f"Unknown regions: {sorted(unknown)}")
+        selected_regions = {
+            name: code for name, code in REGIONS.items() if name in regions
+        }
+
+    usecols = None
+    if columns is not None:
+        # parsed frames call p2a date, region is added by the loader and
+        # p1 is always kept because duplicates are dropped by it
+        wanted = {"p2a" if col == "date" else col for col in columns}
+        wanted.discard("region")
+        wanted.add("p1")
+        unknown = wanted - set(HEADERS)
+        if unknown:
+            raise ValueError(f"Unknown columns: {sorted(unknown)}")
+        usecols = [col for col in HEADERS if col in wanted]
+
+    return year_files, selected_regions, usecols
+
+
+def _select_suffix(
+        year_files: List[str], regions: Dict[str, str], usecols: List[str]
+) -> str:
+    # distinguishes cache files of differently filtered loads
+    if year_files is None and regions is None and usecols is None:
+        return ""
+    key = repr((year_files, regions and list(regions), usecols))
+    return "_" + hashlib.blake2b(key.encode(), digest_size=4).hexdigest()
+
+
+def load_data_iter(
+        filename: str,
+        workers: int = None,
+        typed: bool = False,
+        columns: List[str] = None,
+        regions: List[str] = None,
+        years: List[int] = None,
+) -> Iterator[Tuple[str, str, pd.DataFrame]]:
+    # yields (year, region, chunk) for every region csv in every yearly zip,
+    # so only one chunk has to be held in memory at a time, typed chunks
+    # already have the final dtypes of parse_data, filtered out archives,
+    # region csv files and columns are not read at all
+    year_files, selected_regions, usecols = _select(
+        filename, columns, regions, years
+    )
+    yield from _load_year_files(
+        filename, year_files, workers, typed, selected_regions, usecols
+    )
+
+
+def _cache_file(
+        cache_dir: str,
+        filename: str,
+        stage: str,
+        columns: List[str],
+        regions: List[str],
+        years: List[int],
+) -> str:
+    # cache file of a load, None when cache is disabled
+    if cache_dir is None:
+        return None
+    stage += _select_suffix(*_select(filename, columns, regions, years))
+    return data_cache_file(cache_dir, filename, stage, PARSER_VERSION)
+
+
+def _concat_columns(chunks: List[Dict[str, np.ndarray]]) -> pd.DataFrame:
+    # joins chunks column by column (with the dtype rules of pd.concat) and
+    # drops arrays of a column as soon as it is joined, so the peak is the
+    # final frame plus a few columns instead of all chunks plus the final
+    # frame, columns stay in separate blocks because consolidating them
+    # would copy the whole frame again
+    rows = sum(len(next(iter(chunk.values()))) for chunk in chunks)
+    final_df = pd.DataFrame(index=pd.RangeIndex(rows))
+    for col in list(chunks[0]):
+        parts = [pd.Series(chunk.pop(col), copy=False) for chunk in chunks]
+        final_df[col] = pd.concat(parts, ignore_index=True)
+        del parts
+
+    return final_df
+
+
+def load_data(
+        filename: str,
+        workers: int = None,
+        cache_dir: str = None,
+        columns: List[str] = None,
+        regions: List[str] = None,
+        years: List[int] = None,
+) -> pd.DataFrame:
+    cache_file = _cache_file(
+        cache_dir, filename, "raw", columns, regions, years
+    )
+    final_df = read_frame(cache_file)
+    if final_df is None:
+        # own copy of every column of a chunk, so a joined column can be
+        # released without the rest of the chunk block keeping it alive
+        chunks = []
+        for _, _, df in load_data_iter(
+            filename,
+            workers,
+            columns=columns,
+            regions=regions,
+            years=years,
+        ):
+            chunks.append({
+                col: df[col].to_numpy(copy=True) for col in df.columns
+            })
+            del df
+        if not chunks:
+            return pd.DataFrame()
+
+        final_df = _concat_columns(chunks)
+
+        if cache_file is not None:
+            write_frame(cache_file, final_df)
 
     return final_df
 
@@ -128,30 +564,119 @@ def load_data(filename: str) -> pd.DataFrame:
 # Ukol 2: zpracovani dat
 
 
-def parse_data(df: pd.DataFrame, verbose: bool = False) -> pd.DataFrame:
+def _parse_data(df: pd.DataFrame) -> pd.DataFrame:
     new_df = df.copy()
     new_df.drop_duplicates(subset="p1", inplace=True)
-    new_df["date"] = pd.to_datetime(new_df["p2a"], format="%Y-%m-%d")
-    new_df.drop(columns=["p2a"], inplace=True)
+
+    # frames loaded with columns=... have only some of the columns
+    if "p2a" in new_df:
+        new_df["date"] = pd.to_datetime(new_df["p2a"], format="%Y-%m-%d")
+        new_df.drop(columns=["p2a"], inplace=True)
 
     cols_to_skip = ["date", "region"]
-    category_cols = ["p47", "h", "i", "k", "l", "p", "q", "t"]
-    float_cols = ["a", "b", "d", "e", "f", "g", "n", "o"]
 
     # retype string value columns to category
-    for col in category_cols:
-        new_df[col] = new_df[col].astype("category")
+    for col in CATEGORY_COLS:
+        if col in new_df:
+            new_df[col] = new_df[col].astype("category")
 
     # replace commas with dots in float columns
-    for col in float_cols:
-        new_df[col] = new_df[col].str.replace(",", ".")
+    for col in FLOAT_COLS:
+        if col in new_df:
+            new_df[col] = new_df[col].str.replace(",", ".")
 
     # retype rest of the columns to numeric values
     for col in new_df.columns:
-        if col not in cols_to_skip and col not in category_cols:
+        if col not in cols_to_skip and col not in CATEGORY_COLS:
             new_df[col] = pd.to_numeric(new_df[col], errors="coerce")
 
+    return new_df
+
+
+def optimize_dtypes(
+        df: pd.DataFrame, category_ratio: float = 0.5
+) -> pd.DataFrame:
+    # downcasts every column to the smallest dtype which keeps its values
+    new_df = df.copy()
+
+    for col in new_df.columns:
+        values = new_df[col]
+
+        if pd.api.types.is_integer_dtype(values):
+            # unsigned types have twice the range for non negative codes
+            downcast = "unsigned" if values.min() >= 0 else "integer"
+            new_df[col] = pd.to_numeric(values, downcast=downcast)
+
+        elif pd.api.types.is_float_dtype(values):
+            not_na = values.dropna()
+            if len(not_na) == 0:
+                continue
+
+            if (not_na == np.round(not_na)).all():
+                # integer codes with NaNs, nullable ints keep NaN as mask
+                downcast = "unsigned" if not_na.min() >= 0 else "integer"
+                smallest = pd.to_numeric(not_na, downcast=downcast).dtype
+                nullable = smallest.name.replace("uint", "UInt")
+                new_df[col] = values.astype(nullable.replace("int", "Int"))
+            else:
+                # float32 only when no value changes, coordinates do not fit
+                as_float32 = not_na.astype(np.float32)
+                if (as_float32.astype(np.float64) == not_na).all():
+                    new_df[col] = values.astype(np.float32)
+
+        elif values.dtype == object:
+            if values.nunique() <= category_ratio * len(values):
+                new_df[col] = values.astype("category")
+
+    return new_df
+
+
+def memory_report(before: pd.DataFrame, after: pd.DataFrame) -> pd.DataFrame:
+    # per column memory usage of the frame before and after parsing,
+    # parsed date column is compared with the original p2a column
+    before_usage = before.memory_usage(deep=True)
+    after_usage = after.memory_usage(deep=True)
+
+    rows = []
+    for col in after_usage.index:
+        orig_col = "p2a" if col == "date" and "p2a" in before else col
+        before_mb = before_usage.get(orig_col, 0) / 1e6
+        after_mb = after_usage[col] / 1e6
+        rows.append({
+            "column": col,
+            "dtype_before": (
+                str(before[orig_col].dtype) if orig_col in before else ""
+            ),
+            "dtype_after": str(after[col].dtype) if col in after else "",
+            "before_mb": before_mb,
+            "after_mb": after_mb,
+            "saved_%": (
+                (1 - after_mb / before_mb) * 100 if before_mb else 0.0
+            ),
+        })
+
+    return pd.DataFrame(rows).set_index("column")
+
+
+def parse_data(
+        df: pd.DataFrame, verbose: bool = False, optimize: str = None
+) -> pd.DataFrame:
+    if optimize not in (None, "aggressive"):
+        raise ValueError(f"Unknown optimize mode: {optimize}")
+
+    # not cached, df may be any frame derived from load_data (a slice, a
+    # filtered or edited copy), parsed data are cached by load_parsed_data
+    new_df = _parse_data(df)
+
+    if optimize == "aggressive":
+        new_df = optimize_dtypes(new_df)
+
     if verbose:
+        with pd.option_context(
+            "display.max_rows", None, "display.float_format", "{:.2f}".format
+        ):
+            print(memory_report(df, new_df))
+
         orig_memory_usage = df.memory_usage(deep=True).sum()
         new_memory_usage = new_df.memory_usage(deep=True).sum()
 
@@ -164,13 +689,414 @@ def parse_data(df: pd.DataFrame, verbose: bool = False) -> pd.DataFrame:
     return new_df
 
 
+def _concat_typed(
+        chunks: List[pd.DataFrame], ignore_index: bool = False
+) -> pd.DataFrame:
+    # every chunk has its own categories, unify them so concat keeps
+    # the category dtype (sorted like astype("category") does)
+    for col in CATEGORY_COLS:
+        if col not in chunks[0]:
+            continue
+        categories = sorted(
+            set().union(*(chunk[col].cat.categories for chunk in chunks))
+        )
+        for chunk in chunks:
+            chunk[col] = chunk[col].cat.set_categories(categories)
+
+    return pd.concat(chunks, ignore_index=ignore_index)
+
+
+def load_parsed_data(
+        filename: str,
+        workers: int = None,
+        cache_dir: str = None,
+        columns: List[str] = None,
+        regions: List[str] = None,
+        years: List[int] = None,
+) -> pd.DataFrame:
+    # single pass equivalent of parse_data(load_data(filename)), chunks are
+    # typed while reading so the untyped frame is never materialized
+    cache_file = _cache_file(
+        cache_dir, filename, "parsed", columns, regions, years
+    )
+    final_df = read_frame(cache_file)
+    if final_df is not None:
+        return final_df
+
+    # duplicates are dropped already while streaming so they are never
+    # held, index is the position in the full frame like after concat
+    dedup_index = DedupIndex()
+    chunks = []
+    offset = 0
+    for _, _, df in load_data_iter(
+        filename,
+        workers,
+        typed=True,
+        columns=columns,
+        regions=regions,
+        years=years,
+    ):
+        df.index = pd.RangeIndex(offset, offset + len(df))
+        offset += len(df)
+        chunks.append(dedup_index.drop_duplicates(df))
+
+    if not chunks:
+        return pd.DataFrame()
+
+    final_df = _concat_typed(chunks)
+    chunks.clear()
+
+    if cache_file is not None:
+        write_frame(cache_file, final_df)
+
+    return final_df
+
+
+def _read_manifest(store_dir: str) -> dict:
+    manifest_file = os.path.join(store_dir, "manifest.json")
+    if not os.path.exists(manifest_file):
+        return {}
+
+    with open(manifest_file, "r") as f:
+        manifest = json.load(f)
+
+    # stored years were typed by another parser version, parse them again
+    if manifest.get("parser_version") != PARSER_VERSION:
+        return {}
+    return manifest.get("years", {})
+
+
+def _write_manifest(store_dir: str, years: dict):
+    manifest_file = os.path.join(store_dir, "manifest.json")
+    with atomic_file(manifest_file) as tmp_file:
+        with open(tmp_file, "w") as f:
+            json.dump({"parser_version": PARSER_VERSION, "years": years}, f)
+
+
+def load_data_incremental(
+        filename: str,
+        store_dir: str,
+        workers: int = None,
+        verbose: bool = False,
+) -> pd.DataFrame:
+    # same result as parse_data(load_data(filename)), but every inner
+    # yearly archive is typed only once and stored in store_dir, later
+    # calls parse only archives which are new or whose checksum changed
+    os.makedirs(store_dir, exist_ok=True)
+    stored = _read_manifest(store_dir)
+
+    with zipfile.ZipFile(filename, "r") as data:
+        infos = data.infolist()
+
+    years = {}
+    for info in infos:
+        checksum = f"{info.CRC:08x}-{info.file_size}"
+        entry = stored.get(info.filename)
+        year_file = os.path.join(store_dir, _year_name(info.filename))
+        if (
+            entry is not None
+            and entry["checksum"] == checksum
+            and os.path.exists(f"{year_file}.parquet")
+        ):
+            years[info.filename] = entry
+            continue
+
+        # new or changed yearly archive
+        if verbose:
+            print(f"Parsing {info.filename}")
+
+        chunks = [
+            df for _, _, df in _load_year_files(
+                filename, [info.filename], workers, typed=True
+            )
+        ]
+        year_df = _concat_typed(chunks, ignore_index=True)
+        chunks.clear()
+
+        # duplicates inside one year never survive the global rule, so
+        # they do not have to be stored, index keeps position in the year
+        rows = len(year_df)
+        year_df.drop_duplicates(subset="p1", inplace=True)
+        with atomic_file(f"{year_file}.parquet") as tmp_file:
+            year_df.to_parquet(tmp_file)
+
+        years[info.filename] = {"checksum": checksum, "rows": rows}
+
+    # forget yearly archives which are not in the source anymore
+    for year_name in set(stored) - set(years):
+        old_file = os.path.join(store_dir, f"{_year_name(year_name)}.parquet")
+        if os.path.exists(old_file):
+            os.remove(old_file)
+
+    _write_manifest(store_dir, years)
+
+    if not years:
+        return pd.DataFrame()
+
+    # join stored years in archive order, index is shifted by row count
+    # of previous years so it matches index of the full load_data frame
+    # first occurrence wins across old and new years like in parse_data
+    dedup_index = DedupIndex()
+    chunks = []
+    offset = 0
+    for year_name, entry in years.items():
+        year_df = pd.read_parquet(
+            os.path.join(store_dir, f"{_year_name(year_name)}.parquet")
+        )
+        year_df.index = year_df.index + offset
+        offset += entry["rows"]
+        chunks.append(dedup_index.drop_duplicates(year_df))
+
+    final_df = _concat_typed(chunks)
+    chunks.clear()
+
+    return final_df
+
+
+# Agregovana data pro grafy
+
+# keys of the aggregate cube, hour is p2b // 100 (25 for unknown time)
+CUBE_KEYS = ["region", "date", "p57", "p11", "p10", "hour"]
+
+
+def build_cube(df: pd.DataFrame) -> pd.DataFrame:
+    # counts of accidents per region x day x driver state x alcohol x fault
+    # x hour computed in one pass, every plot is then an aggregation of
+    # this small frame instead of a pass over all accidents
+    keys = [
+        df["region"],
+        df["date"],
+        df["p57"],
+        df["p11"],
+        df["p10"],
+        (df["p2b"] // 100).rename("hour"),
+    ]
+    cube = (
+        df.groupby(keys, observed=True, dropna=False, sort=True)
+        .size()
+        .reset_index(name="count")
+    )
+
+    # keys with few values and counts fit into small types
+    cube["region"] = cube["region"].astype("category")
+    for col in ["p57", "p11", "p10", "hour"]:
+        if pd.api.types.is_integer_dtype(cube[col]):
+            cube[col] = pd.to_numeric(cube[col], downcast="integer")
+    cube["count"] = pd.to_numeric(cube["count"], downcast="unsigned")
+
+    return cube
+
+
+def _as_cube(df: pd.DataFrame) -> pd.DataFrame:
+    # plots accept either parsed accidents or an already built cube
+    if "count" in df.columns and set(CUBE_KEYS) <= set(df.columns):
+        return df
+    return build_cube(df)
+
+
+def _cube_counts(
+        cube: pd.DataFrame, keys: List, name: str = "count"
+) -> pd.DataFrame:
+    return (
+        cube.groupby(keys, observed=True)["count"]
+        .sum()
+        .astype("int64")
+        .reset_index(name=name)
+    )
+
+
+# regions plotted by plot_alcohol and plot_fault when none are given
+DEFAULT_PLOT_REGIONS = ["JHM", "MSK", "OLK", "ZLK"]
+
+
+def _region_axes(
+        regions: List[str], width: float, height: float, **kwargs
+) -> Tuple[plt.Figure, np.ndarray]:
+    # one subplot per region in two columns, unused subplots are hidden
+    ncols = 2 if len(regions) > 1 else 1
+    nrows = math.ceil(len(regions) / ncols)
+    fig, axes = plt.subplots(
+        nrows,
+        ncols,
+        figsize=(width * ncols, height * nrows),
+        constrained_layout=True,
+        **kwargs,
+    )
+    axes_flat = np.atleast_1d(axes).flatten()
+    for ax in axes_flat[len(regions):]:
+        ax.set_visible(False)
+    return fig, axes_flat
+
+
+# Casove rady
+
+# frequencies of count_periods, periods are labeled by their last day like
+# in pandas resample ("W" are weeks from Monday to Sunday)
+PERIOD_FREQS = ["D", "W", "M", "Q"]
+
+
+def _period_codes(dates: np.ndarray, freq: str) -> np.ndarray:
+    # integer code of the period every datetime64 date falls into
+    if freq == "D":
+        return dates.astype("datetime64[D]").astype(np.int64)
+    if freq == "W":
+        # 1970-01-01 was Thursday, shift so that weeks start on Monday
+        return (dates.astype("datetime64[D]").astype(np.int64) + 3) // 7
+    months = dates.astype("datetime64[M]").astype(np.int64)
+    if freq == "M":
+        return months
+    if freq == "Q":
+        return months // 3
+    raise ValueError(f"unknown frequency {freq!r}, use one of {PERIOD_FREQS}")
+
+
+def _period_labels(codes: np.ndarray, freq: str) -> pd.DatetimeIndex:
+    # last day of every period given by its code
+    if freq == "D":
+        days = codes
+    elif freq == "W":
+        days = codes * 7 + 3
+    else:
+        next_month = codes + 1 if freq == "M" else codes * 3 + 3
+        days = next_month.astype("datetime64[M]").astype(
+            "datetime64[D]"
+        ).astype(np.int64) - 1
+    return pd.DatetimeIndex(days.astype("datetime64[D]").astype("M8[ns]"))
+
+
+def _label_codes(values, order: List = None) -> Tuple[np.ndarray, List]:
+    # codes of values in order (sorted unique values by default), missing
+    # values and values out of order get -1
+    values = pd.Series(values)
+    if order is None:
+        order = sorted(values.dropna().unique())
+    codes = pd.Categorical(values.astype(object), categories=order).codes
+    return codes.astype(np.int64), list(order)
+
+
+def count_periods(
+        dates: pd.Series,
+        groups: pd.Series,
+        categories: pd.Series,
+        freq: str = "M",
+        start: str = None,
+        end: str = None,
+        weights: pd.Series = None,
+        group_order: List = None,
+        category_order: List = None,
+) -> Tuple[np.ndarray, List, pd.DatetimeIndex, List]:
+    # counts of rows per group x period x category in one np.bincount over
+    # integer codes, periods cover the whole window (from start to end
+    # including, data range by default) so missing periods have zero
+    # count, weights sum e.g. counts of an aggregate cube instead of rows
+    dates = pd.to_datetime(pd.Series(dates)).to_numpy("datetime64[ns]")
+    group_codes, group_order = _label_codes(groups, group_order)
+    cat_codes, category_order = _label_codes(categories, category_order)
+
+    valid = ~np.isnat(dates) & (group_codes >= 0) & (cat_codes >= 0)
+    period_codes = np.zeros(len(dates), dtype=np.int64)
+    period_codes[valid] = _period_codes(dates[valid], freq)
+
+    if start is not None:
+        first = _period_codes(np.array([start], "M8[ns]"), freq)[0]
+    elif valid.any():
+        first = period_codes[valid].min()
+    else:
+        first = 0
+    if end is not None:
+        last = _period_codes(np.array([end], "M8[ns]"), freq)[0]
+    elif valid.any():
+        last = period_codes[valid].max()
+    else:
+        last = first - 1
+
+    valid &= (period_codes >= first) & (period_codes <= last)
+    n_periods = max(last - first + 1, 0)
+    shape = (len(group_order), n_periods, len(category_order))
+
+    flat = (
+        group_codes[valid] * n_periods + period_codes[valid] - first
+    ) * shape[2] + cat_codes[valid]
+    if weights is not None:
+        weights = np.asarray(weights, dtype=np.float64)[valid]
+    counts = np.bincount(flat, weights, minlength=int(np.prod(shape)))
+    counts = np.rint(counts).astype(np.int64).reshape(shape)
+
+    periods = _period_labels(np.arange(first, last + 1), freq)
+    return counts, group_order, periods, category_order
+
+
+# labels of hourly_profile axes, weekdays start on Monday and alcohol
+# flag is p11 1-2 (Ne) and 3-9 (Ano) like in plot_alcohol
+WEEKDAYS = ["Po", "Út", "St", "Čt", "Pá", "So", "Ne"]
+ALCOHOL_LABELS = ["Ne", "Ano"]
+
+
+def hourly_profile(
+        df: pd.DataFrame, regions: List[str] = None
+) -> Tuple[np.ndarray, List[str]]:
+    # counts of accidents per region x weekday x hour x alcohol flag in one
+    # np.bincount, df are parsed accidents or the aggregate cube, weekday
+    # is taken from date so that the cube (without weekday) works as well
+    if regions is None:
+        regions = list(REGIONS)
+
+    region_codes, regions = _label_codes(df["region"], regions)
+    if "count" in df.columns and "hour" in df.columns:
+        hours = df["hour"].to_numpy(np.float64, na_value=np.nan)
+        weights = df["count"].to_numpy(np.float64)
+    else:
+        hours = df["p2b"].to_numpy(np.float64, na_value=np.nan) // 100
+        weights = None
+    days = df["date"].to_numpy("datetime64[D]").astype(np.int64)
+    # 1970-01-01 was Thursday
+    weekdays = (days + 3) % 7
+
+    p11 = df["p11"].to_numpy(np.float64, na_value=np.nan)
+    alcohol = np.full(len(df), -1, dtype=np.int64)
+    alcohol[(p11 >= 1) & (p11 <= 2)] = 0
+    alcohol[(p11 >= 3) & (p11 <= 9)] = 1
+
+    valid = (
+        (region_codes >= 0)
+        & (hours >= 0)
+        & (hours <= 23)
+        & ~np.isnat(df["date"].to_numpy("datetime64[D]"))
+        & (alcohol >= 0)
+    )
+    shape = (len(regions), len(WEEKDAYS), 24, len(ALCOHOL_LABELS))
+    flat = (
+        (region_codes[valid] * shape[1] + weekdays[valid]) * shape[2]
+        + hours[valid].astype(np.int64)
+    ) * shape[3] + alcohol[valid]
+    if weights is not None:
+        weights = weights[valid]
+    counts = np.bincount(flat, weights, minlength=int(np.prod(shape)))
+
+    return np.rint(counts).astype(np.int64).reshape(shape), regions
+
+
+def _figure_cache_key(
+        cache_dir: str, fig_location: str, show_figure: bool, name: str,
+        *parts
+) -> str:
+    # key of the figure in figure cache, None when the figure is not cached
+    # (no cache, figure is not saved or it is shown and has to be drawn)
+    if cache_dir is None or not fig_location or show_figure:
+        return None
+    return figure_key(name, *parts)
+
+
 # Ukol 3: počty nehod oidke stavu řidiče
 
 
 def plot_state(
-        df: pd.DataFrame, fig_location: str = None, show_figure: bool = False
+        df: pd.DataFrame,
+        fig_location: str = None,
+        show_figure: bool = False,
+        cache_dir: str = None,
 ):
-    df_copy = df.copy()
+    cube = _as_cube(df)
     state_map = {
         7: "invalida",
         6: "nemoc, úraz apod.",
@@ -180,10 +1106,16 @@ def plot_state(
         8: "řidič při jízdě zemřel (infarkt apod.)",
     }
 
-    df_copy["state"] = df_copy["p57"].map(state_map)
+    state = cube["p57"].map(state_map).rename("state")
+    grouped_data = _cube_counts(
+        cube, [cube["region"].astype(object), state]
+    )
 
-    grouped_data = df_copy.groupby(
-        ["region", "state"]).size().reset_index(name="count")
+    key = _figure_cache_key(
+        cache_dir, fig_location, show_figure, "plot_state", grouped_data
+    )
+    if key is not None and load_figure(cache_dir, key, fig_location):
+        return
 
     sns.set_style("whitegrid")
 
@@ -215,6 +1147,8 @@ def plot_state(
 
     if fig_location:
         fig.savefig(fig_location, bbox_inches="tight")
+        if key is not None:
+            store_figure(cache_dir, key, fig_location)
 
     if show_figure:
         plt.show()
@@ -224,32 +1158,37 @@ def plot_state(
 
 # Ukol4: alkohol v jednotlivých hodinách
 def plot_alcohol(
-        df: pd.DataFrame, fig_location: str = None, show_figure: bool = False
+        df: pd.DataFrame,
+        fig_location: str = None,
+        show_figure: bool = False,
+        regions: List[str] = None,
+        cache_dir: str = None,
 ):
-    df_copy = df.copy()
-
-    # convert to hourse and get only hourse between 0 - 23
-    df_copy["p2b"] = df_copy["p2b"] // 100
-    df_copy = df_copy[df_copy["p2b"].between(0, 23)]
-
-    # create category for alcohol
-    df_copy["Pod vlivem"] = pd.cut(
-        df_copy["p11"], bins=[0, 2, 9], labels=["Ne", "Ano"]
-        )
-
-    grouped_data = (
-        df_copy.groupby(["region", "p2b", "Pod vlivem"], observed=True)
-        .size()
-        .reset_index(name="count")
+    if regions is None:
+        regions = DEFAULT_PLOT_REGIONS
+
+    # hourly counts summed over weekdays, hours without accidents of the
+    # given kind are left out like in a groupby
+    counts, _ = hourly_profile(df, regions)
+    hourly = counts.sum(axis=1)
+    index = np.nonzero(hourly)
+    grouped_data = pd.DataFrame({
+        "region": np.array(regions, dtype=object)[index[0]],
+        "p2b": index[1],
+        "Pod vlivem": np.array(ALCOHOL_LABELS)[index[2]],
+        "count": hourly[index],
+    })
+
+    key = _figure_cache_key(
+        cache_dir, fig_location, show_figure, "plot_alcohol", regions,
+        grouped_data
     )
+    if key is not None and load_figure(cache_dir, key, fig_location):
+        return
 
     sns.set_style("whitegrid")
 
-    fig, axes = plt.subplots(2, 2, figsize=(14, 10), constrained_layout=True)
-
-    axes_flat = axes.flatten()
-
-    regions = ["JHM", "MSK", "OLK", "ZLK"]
+    fig, axes_flat = _region_axes(regions, 7, 5)
 
     for idx, region in enumerate(regions):
         ax = axes_flat[idx]
@@ -270,7 +1209,9 @@ def plot_alcohol(
         ax.set_xlabel("Hodina")
         ax.set_ylabel("Počet nehod")
 
-        ax.get_legend().remove()
+        # region without any accidents has no legend
+        if ax.get_legend() is not None:
+            ax.get_legend().remove()
 
     handles, labels = ax.get_legend_handles_labels()
     fig.legend(
@@ -284,6 +1225,8 @@ def plot_alcohol(
 
     if fig_location:
         fig.savefig(fig_location, bbox_inches="tight")
+        if key is not None:
+            store_figure(cache_dir, key, fig_location)
 
     if show_figure:
         plt.show()
@@ -294,9 +1237,16 @@ def plot_alcohol(
 # Ukol 5: Zavinění nehody v čase
 
 def plot_fault(
-        df: pd.DataFrame, fig_location: str = None, show_figure: bool = False
+        df: pd.DataFrame,
+        fig_location: str = None,
+        show_figure: bool = False,
+        regions: List[str] = None,
+        start_date: str = "2016-01-01",
+        end_date: str = "2023-01-01",
+        freq: str = "M",
+        cache_dir: str = None,
 ):
-    df_copy = df.copy()
+    cube = _as_cube(df)
 
     fault_map = {
         1: "Řidičem motorového vozidla",
@@ -305,39 +1255,50 @@ def plot_fault(
         4: "Zvířetem",
     }
 
-    df_copy["fault"] = df_copy["p10"].map(fault_map)
-
-    pivot_df = df_copy.pivot_table(
-        index=["date", "region"], columns="fault", aggfunc="size", fill_value=0
+    regions_to_plot = regions
+    if regions_to_plot is None:
+        regions_to_plot = DEFAULT_PLOT_REGIONS
+
+    # faults present anywhere in data are plotted, sorted by name
+    fault = cube["p10"].map(fault_map)
+    counts, _, periods, faults = count_periods(
+        cube["date"],
+        cube["region"],
+        fault,
+        freq=freq,
+        start=start_date,
+        end=end_date,
+        weights=cube["count"],
+        group_order=regions_to_plot,
+        category_order=sorted(fault.dropna().unique()),
     )
 
-    monthly_data = pivot_df.groupby("region").resample("M", level=0).sum()
-
-    stacked_monthly_data = monthly_data.stack().reset_index(name="count")
-    stacked_monthly_data.columns = ["region", "date", "fault", "count"]
-
-    start_date = pd.Timestamp("2016-01-01")
-    end_date = pd.Timestamp("2023-01-01")
-    regions_to_plot = ["JHM", "MSK", "OLK", "ZLK"]
+    key = _figure_cache_key(
+        cache_dir, fig_location, show_figure, "plot_fault", regions_to_plot,
+        start_date, end_date, counts, periods, faults
+    )
+    if key is not None and load_figure(cache_dir, key, fig_location):
+        return
 
-    fig, axes = plt.subplots(
-        2, 2, figsize=(12, 10), sharey=True, sharex=True,
-        constrained_layout=True
+    fig, axes_flat = _region_axes(
+        regions_to_plot, 6, 5, sharey=True, sharex=True
     )
-    axes_flat = axes.flatten()
     for i, region in enumerate(regions_to_plot):
         ax = axes_flat[i]
-        region_data = stacked_monthly_data[
-            stacked_monthly_data["region"] == region
-        ]
+        region_data = pd.DataFrame({
+            "date": np.repeat(periods, len(faults)),
+            "fault": np.tile(faults, len(periods)),
+            "count": counts[i].ravel(),
+        })
         sns.lineplot(x="date", y="count", hue="fault", data=region_data, ax=ax)
         ax.set_title(f"Kraj: {region}")
         ax.set_ylabel("Počet nehod")
         ax.set_xlabel("Období")
-        ax.get_legend().remove()
+        if ax.get_legend() is not None:
+            ax.get_legend().remove()
 
         # limit the x axis and format the date
-        ax.set_xlim([start_date, end_date])
+        ax.set_xlim([pd.Timestamp(start_date), pd.Timestamp(end_date)])
         ax.xaxis.set_major_formatter(mdates.DateFormatter("01/%y"))
 
     handles, labels = ax.get_legend_handles_labels()
@@ -352,6 +1313,78 @@ def plot_fault(
 
     if fig_location:
         fig.savefig(fig_location, bbox_inches="tight")
+        if key is not None:
+            store_figure(cache_dir, key, fig_location)
+
+    if show_figure:
+        plt.show()
+    else:
+        plt.close(fig)
+
+
+# Casovy profil nehod (hodina x den v tydnu) ve vsech krajich
+
+def plot_profile(
+        df: pd.DataFrame,
+        fig_location: str = None,
+        show_figure: bool = False,
+        regions: List[str] = None,
+        kind: str = "heatmap",
+        cache_dir: str = None,
+):
+    # heatmap of accidents under influence per weekday x hour, or bars of
+    # hourly counts with and without alcohol, for all regions by default
+    if kind not in ("heatmap", "bar"):
+        raise ValueError(f"unknown kind {kind!r}, use heatmap or bar")
+
+    counts, regions = hourly_profile(df, regions)
+
+    key = _figure_cache_key(
+        cache_dir, fig_location, show_figure, "plot_profile", regions, kind,
+        counts
+    )
+    if key is not None and load_figure(cache_dir, key, fig_location):
+        return
+
+    sns.set_style("whitegrid")
+    fig, axes_flat = _region_axes(regions, 7, 3.5, sharex=True)
+
+    vmax = counts[..., 1].max() if counts.size else None
+    for idx, region in enumerate(regions):
+        ax = axes_flat[idx]
+        if kind == "heatmap":
+            sns.heatmap(
+                pd.DataFrame(counts[idx, :, :, 1], index=WEEKDAYS),
+                ax=ax,
+                cmap="rocket_r",
+                vmin=0,
+                vmax=vmax,
+                cbar=idx == len(regions) - 1,
+            )
+            ax.set_ylabel("Den v týdnu")
+        else:
+            hourly = counts[idx].sum(axis=0)
+            ax.bar(np.arange(24) - 0.2, hourly[:, 1], 0.4, label="Ano")
+            ax.bar(np.arange(24) + 0.2, hourly[:, 0], 0.4, label="Ne")
+            ax.set_ylabel("Počet nehod")
+        ax.set_title(f"Kraj: {region}")
+        ax.set_xlabel("Hodina")
+
+    if kind == "bar":
+        handles, labels = ax.get_legend_handles_labels()
+        fig.legend(
+            handles,
+            labels,
+            loc="center",
+            bbox_to_anchor=(1.05, 0.5),
+            title="Alkohol",
+            frameon=False,
+        )
+
+    if fig_location:
+        fig.savefig(fig_location, bbox_inches="tight")
+        if key is not None:
+            store_figure(cache_dir, key, fig_location)
 
     if show_figure:
         plt.show()
@@ -360,9 +1393,12 @@ def plot_fault(
 
 
 if __name__ == "__main__":
-    df = load_data("data.zip")
+    df = load_data("data.zip", cache_dir=".izv_cache")
     df2 = parse_data(df, True)
 
-    plot_state(df2, "01_state.png")
-    plot_alcohol(df2, "02_alcohol.png", True)
-    plot_fault(df2, "03_fault.png", True)
+    # all plots are aggregated from one pass over the accidents
+    cube = build_cube(df2)
+    plot_state(cube, "01_state.png", cache_dir=".izv_cache")
+    plot_alcohol(cube, "02_alcohol.png", True)
+    plot_fault(cube, "03_fault.png", True)
+    plot_profile(cube, "04_profile.png", cache_dir=".izv_cache")
@@ -0,0 +1,191 @@
+#!/usr/bin/env python3.11
+# coding=utf-8
+
+# Benchmarks of data ingestion
+#
+# Usage: python benchmark.py data.zip --workers 1 4 16
+#        python benchmark.py data.zip --suite --json results.json
+#        python benchmark.py synthetic.zip --synthetic --years 8 --suite
+
+import argparse
+import json
+import multiprocessing
+import os
+import resource
+import shutil
+import tempfile
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List
+
+import analysis
+import synthetic
+
+
+def make_subset(filename: str, years: int, target: str):
+    # copy first `years` yearly archives into a new outer zip file
+    with zipfile.ZipFile(filename, "r") as src:
+        with zipfile.ZipFile(target, "w") as dst:
+            for year_file in src.namelist()[:years]:
+                dst.writestr(src.getinfo(year_file), src.read(year_file))
+
+
+def bench_workers(filename: str, workers: List[int], repeat: int = 1):
+    with zipfile.ZipFile(filename, "r") as data:
+        total_years = len(data.namelist())
+
+    print(f"{'years':>5} {'workers':>7} {'rows':>9} {'time [s]':>9} "
+          f"{'speedup':>7}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for years in range(1, total_years + 1):
+            subset = os.path.join(tmp, f"data_{years}.zip")
+            make_subset(filename, years, subset)
+
+            serial_time = None
+            for worker_count in workers:
+                best = None
+                for _ in range(repeat):
+                    start = time.perf_counter()
+                    df = analysis.load_data(subset, workers=worker_count)
+                    elapsed = time.perf_counter() - start
+                    best = elapsed if best is None else min(best, elapsed)
+
+                if serial_time is None:
+                    serial_time = best
+
+                print(f"{years:>5} {worker_count:>7} {len(df):>9} "
+                      f"{best:>9.3f} {serial_time / best:>6.2f}x")
+
+
+# ingestion paths of the suite, every path gets the source archive, number
+# of workers and a work directory shared by cold and warm runs of a path
+INGESTION_PATHS = {
+    "load_data+parse_data": lambda filename, workers, workdir: (
+        analysis.parse_data(analysis.load_data(filename, workers))
+    ),
+    "load_parsed_data": lambda filename, workers, workdir: (
+        analysis.load_parsed_data(filename, workers)
+    ),
+    "cache (cold)": lambda filename, workers, workdir: (
+        analysis.parse_data(
+            analysis.load_data(filename, workers, cache_dir=workdir)
+        )
+    ),
+    "cache (warm)": lambda filename, workers, workdir: (
+        analysis.parse_data(
+            analysis.load_data(filename, workers, cache_dir=workdir)
+        )
+    ),
+    "parsed cache (cold)": lambda filename, workers, workdir: (
+        analysis.load_parsed_data(filename, workers, cache_dir=workdir)
+    ),
+    "parsed cache (warm)": lambda filename, workers, workdir: (
+        analysis.load_parsed_data(filename, workers, cache_dir=workdir)
+    ),
+    "incremental (cold)": lambda filename, workers, workdir: (
+        analysis.load_data_incremental(filename, workdir, workers)
+    ),
+    "incremental (warm)": lambda filename, workers, workdir: (
+        analysis.load_data_incremental(filename, workdir, workers)
+    ),
+}
+
+
+def _peak_rss_mb() -> float:
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _measure(path: str, filename: str, workers: int, workdir: str) -> Dict:
+    # runs in a fresh process so peak RSS belongs to this path only, with
+    # more workers it is RSS of the process which joins the chunks
+    base_rss = _peak_rss_mb()
+    start = time.perf_counter()
+    df = INGESTION_PATHS[path](filename, workers, workdir)
+    elapsed = time.perf_counter() - start
+
+    return {
+        "path": path,
+        "workers": workers or 1,
+        "rows": len(df),
+        "time_s": elapsed,
+        "rows_per_s": len(df) / elapsed if elapsed else 0.0,
+        "peak_rss_mb": _peak_rss_mb(),
+        "delta_rss_mb": _peak_rss_mb() - base_rss,
+    }
+
+
+def bench_suite(
+        filename: str, workers: List[int], json_file: str = None
+) -> List[Dict]:
+    results = []
+    context = multiprocessing.get_context("spawn")
+
+    print(f"{'path':<22} {'workers':>7} {'rows':>9} {'time [s]':>9} "
+          f"{'rows/s':>10} {'peak RSS':>9} {'delta RSS':>9}")
+
+    for worker_count in workers:
+        workdir = tempfile.mkdtemp(prefix="izv_bench_")
+        try:
+            for path in INGESTION_PATHS:
+                # warm runs reuse the directory filled by the cold run
+                if path.endswith("(cold)"):
+                    shutil.rmtree(workdir)
+                    os.makedirs(workdir)
+
+                with ProcessPoolExecutor(1, mp_context=context) as executor:
+                    result = executor.submit(
+                        _measure, path, filename, worker_count, workdir
+                    ).result()
+                results.append(result)
+
+                print(f"{result['path']:<22} {result['workers']:>7} "
+                      f"{result['rows']:>9} {result['time_s']:>9.3f} "
+                      f"{result['rows_per_s']:>10.0f} "
+                      f"{result['peak_rss_mb']:>6.0f} MB "
+                      f"{result['delta_rss_mb']:>6.0f} MB")
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    if json_file is not None:
+        with open(json_file, "w") as f:
+            json.dump(results, f, indent=2)
+
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Benchmarks of data ingestion"
+    )
+    parser.add_argument("filename", nargs="?", default="data.zip")
+    parser.add_argument("--workers", type=int, nargs="+",
+                        default=[1, 2, 4, os.cpu_count() or 1])
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--suite", action="store_true",
+                        help="measure every ingestion path")
+    parser.add_argument("--json", default=None,
+                        help="write suite results into json file")
+    parser.add_argument("--synthetic", action="store_true",
+                        help="generate synthetic archive into filename")
+    parser.add_argument("--years", type=int, default=8)
+    parser.add_argument("--rows", type=int, default=None,
+                        help="rows per year of synthetic archive")
+    parser.add_argument("--size-mb", type=float, default=None,
+                        help="target size of synthetic archive")
+    args = parser.parse_args()
+
+    if args.synthetic:
+        synthetic.generate_data(
+            args.filename,
+            years=args.years,
+            rows=args.rows,
+            target_mb=args.size_mb,
+        )
+
+    if args.suite:
+        bench_suite(args.filename, args.workers, args.json)
+    else:
+        bench_workers(args.filename, args.workers, args.repeat)
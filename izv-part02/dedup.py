@@ -0,0 +1,82 @@
+#!/usr/bin/env python3.11
+# coding=utf-8
+
+# Author: Lukas Vecerka (xvecer30)
+# Date: 2023-12
+
+import numpy as np
+import pandas as pd
+from typing import List
+
+# Index of already seen accident ids (p1) for chunked loading, it applies
+# the same first occurrence wins rule as drop_duplicates(subset="p1").
+#
+# Ids are kept as sorted runs of int64 values, so the index costs 8 B per
+# unique accident, i.e. ~8 MB per million accidents (up to ~16 MB for a
+# moment while two runs are merged). Python set of the same ids would need
+# ~60 MB. Runs are merged when the newer one grows to half of the older
+# one, so there are at most log2(n) runs to search and every id is copied
+# only log2(n) times in total.
+
+
+class DedupIndex:
+    def __init__(self):
+        self._runs: List[np.ndarray] = []
+
+    def __len__(self) -> int:
+        return sum(len(run) for run in self._runs)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(run.nbytes for run in self._runs)
+
+    def contains(self, ids) -> np.ndarray:
+        # boolean mask of ids which were already added
+        ids = np.asarray(ids, dtype=np.int64)
+        found = np.zeros(len(ids), dtype=bool)
+        for run in self._runs:
+            pos = np.searchsorted(run, ids)
+            pos[pos == len(run)] = 0
+            found |= run[pos] == ids
+        return found
+
+    def add(self, ids):
+        # adds ids, already seen ones are ignored
+        ids = np.unique(np.asarray(ids, dtype=np.int64))
+        self._push(ids[~self.contains(ids)])
+
+    def _push(self, ids: np.ndarray):
+        # ids have to be sorted, unique and not in the index yet
+        if len(ids) == 0:
+            return
+
+        self._runs.append(ids)
+        while (
+            len(self._runs) > 1
+            and len(self._runs[-2]) <= 2 * len(self._runs[-1])
+        ):
+            newer = self._runs.pop()
+            older = self._runs.pop()
+            merged = np.concatenate([older, newer])
+            merged.sort(kind="mergesort")
+            self._runs.append(merged)
+
+    def first_occurrence(self, ids) -> np.ndarray:
+        # boolean mask of ids seen for the first time (not added before and
+        # first in this batch), all of them are added to the index
+        ids = np.asarray(ids, dtype=np.int64)
+        mask = np.zeros(len(ids), dtype=bool)
+        _, first = np.unique(ids, return_index=True)
+        mask[first] = True
+        mask &= ~self.contains(ids)
+        self._push(np.sort(ids[mask]))
+        return mask
+
+    def drop_duplicates(
+        self, df: pd.DataFrame, column: str = "p1"
+    ) -> pd.DataFrame:
+        # chunk without rows whose id was already seen in this or previous
+        # chunks, boolean indexing already copied the data so the shallow
+        # copy only detaches the result from df
+        mask = self.first_occurrence(df[column].to_numpy())
+        return df[mask].copy(deep=False)
@@ -0,0 +1,210 @@
+#!/usr/bin/env python3.11
+# coding=utf-8
+
+# Generator of synthetic data.zip with the same layout as the police
+# archive: one inner zip per year with 14 {region_code}.csv files, cp1250
+# encoding, ";" separators, comma decimals, duplicate p1 values and
+# optionally malformed values in float columns (like "A:" in the real data)
+#
+# Usage: python synthetic.py data.zip --years 8 --rows 50000
+
+import argparse
+import io
+import zipfile
+
+import numpy as np
+import pandas as pd
+
+from analysis import CATEGORY_COLS, FLOAT_COLS, HEADERS, REGIONS
+
+# ranges of S-JTSK coordinates of the Czech Republic
+X_RANGE = (-905000.0, -431000.0)
+Y_RANGE = (-1227000.0, -935000.0)
+
+STREETS = ["Silnice", "Ulice", "Dálnice", "Místní komunikace", "Náměstí"]
+
+
+def _region_chunk(
+        rng: np.random.Generator,
+        ids: np.ndarray,
+        year: int,
+        bad_values: float = 0.0,
+) -> pd.DataFrame:
+    rows = len(ids)
+    columns = {}
+
+    # integer code columns
+    for col in HEADERS:
+        columns[col] = rng.integers(0, 10, rows).astype(str)
+
+    columns["p1"] = ids.astype(str)
+    columns["p37"] = np.where(
+        rng.random(rows) < 0.5, "", rng.integers(1, 999, rows).astype(str)
+    )
+
+    dates = pd.Timestamp(f"{year}-01-01") + pd.to_timedelta(
+        rng.integers(0, 365, rows), unit="D"
+    )
+    columns["p2a"] = dates.strftime("%Y-%m-%d")
+    columns["weekday(p2a)"] = dates.weekday.astype(str)
+
+    # hhmm time, 2560 is used for unknown time
+    columns["p2b"] = np.where(
+        rng.random(rows) < 0.02,
+        2560,
+        rng.integers(0, 24, rows) * 100 + rng.integers(0, 60, rows),
+    ).astype(str)
+    columns["p10"] = rng.integers(0, 8, rows).astype(str)
+    columns["p11"] = rng.choice(
+        [0, 1, 2, 3, 4, 5, 6, 7, 8, 9],
+        rows,
+        p=[0.05, 0.6, 0.25, 0.02, 0.02, 0.02, 0.01, 0.01, 0.01, 0.01],
+    ).astype(str)
+    columns["p12"] = rng.integers(100, 616, rows).astype(str)
+    columns["p45a"] = rng.integers(1, 100, rows).astype(str)
+    columns["p53"] = (rng.integers(0, 5000, rows) * 100).astype(str)
+    columns["p57"] = rng.integers(1, 10, rows).astype(str)
+
+    # two digit year of the car or XX when unknown
+    columns["p47"] = np.where(
+        rng.random(rows) < 0.1,
+        "XX",
+        np.char.zfill(rng.integers(0, 100, rows).astype(str), 2),
+    )
+
+    # float columns with comma decimals, d and e are coordinates
+    for col in FLOAT_COLS:
+        values = rng.uniform(-1000.0, 1000.0, rows)
+        if col == "d":
+            values = rng.uniform(*X_RANGE, rows)
+        elif col == "e":
+            values = rng.uniform(*Y_RANGE, rows)
+        text = np.char.replace(np.round(values, 2).astype(str), ".", ",")
+        columns[col] = np.where(rng.random(rows) < 0.01, "", text)
+        # randomness is drawn only when asked for, so archives generated
+        # without bad values stay the same for a seed
+        if bad_values > 0:
+            columns[col] = np.where(
+                rng.random(rows) < bad_values, "A:", columns[col]
+            )
+
+    for col in CATEGORY_COLS:
+        if col != "p47":
+            columns[col] = rng.choice(STREETS, rows)
+
+    return pd.DataFrame({col: columns[col] for col in HEADERS})
+
+
+def _year_archive(
+        rng: np.random.Generator,
+        year: int,
+        rows: int,
+        next_id: int,
+        duplicates: float,
+        bad_values: float = 0.0,
+) -> bytes:
+    buffer = io.BytesIO()
+    per_region = np.full(len(REGIONS), rows // len(REGIONS))
+    per_region[: rows % len(REGIONS)] += 1
+
+    regions = zip(REGIONS.values(), per_region)
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        for region_code, region_rows in regions:
+            ids = np.arange(next_id, next_id + region_rows)
+            next_id += region_rows
+
+            # some accidents are reported again with an already used id
+            dup_mask = rng.random(region_rows) < duplicates
+            if dup_mask.any():
+                ids[dup_mask] = rng.integers(1, next_id, dup_mask.sum())
+
+            # fixed timestamps keep the archive identical for the same seed
+            df = _region_chunk(rng, ids, year, bad_values)
+            info = zipfile.ZipInfo(
+                f"{region_code}.csv", date_time=(year, 12, 31, 0, 0, 0)
+            )
+            info.compress_type = zipfile.ZIP_DEFLATED
+            archive.writestr(
+                info,
+                df.to_csv(sep=";", header=False, index=False).encode(
+                    "cp1250"
+                ),
+            )
+
+    return buffer.getvalue()
+
+
+def estimate_rows(target_mb: float, years: int, seed: int = 0) -> int:
+    # rows per year which give outer archive of about target_mb megabytes
+    sample_rows = 2000
+    sample = _year_archive(
+        np.random.default_rng(seed), 2016, sample_rows, 1, 0.0
+    )
+    bytes_per_row = len(sample) / sample_rows
+    return max(len(REGIONS), int(target_mb * 1e6 / bytes_per_row / years))
+
+
+def generate_data(
+        filename: str,
+        years: int = 8,
+        rows: int = None,
+        target_mb: float = None,
+        duplicates: float = 0.01,
+        first_year: int = 2016,
+        seed: int = 0,
+        bad_values: float = 0.0,
+) -> int:
+    # writes synthetic archive and returns number of generated rows, size
+    # is given either by rows per year or by target size of the archive
+    if rows is None:
+        rows = (
+            estimate_rows(target_mb, years, seed)
+            if target_mb is not None
+            else 10000
+        )
+
+    rng = np.random.default_rng(seed)
+    next_id = 1
+
+    # inner yearly archives are stored, like in the original archive
+    with zipfile.ZipFile(filename, "w", zipfile.ZIP_STORED) as data:
+        for year in range(first_year, first_year + years):
+            archive = _year_archive(
+                rng, year, rows, next_id, duplicates, bad_values
+            )
+            next_id += rows
+            info = zipfile.ZipInfo(
+                f"{year}.zip", date_time=(year, 12, 31, 0, 0, 0)
+            )
+            data.writestr(info, archive)
+
+    return rows * years
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Generator of synthetic accident archive"
+    )
+    parser.add_argument("filename", nargs="?", default="data.zip")
+    parser.add_argument("--years", type=int, default=8)
+    parser.add_argument("--rows", type=int, default=None,
+                        help="rows per year")
+    parser.add_argument("--size-mb", type=float, default=None,
+                        help="target size of the archive")
+    parser.add_argument("--duplicates", type=float, default=0.01,
+                        help="fraction of rows with already used p1")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--bad-values", type=float, default=0.0,
+                        help="fraction of malformed float values")
+    args = parser.parse_args()
+
+    total = generate_data(
+        args.filename,
+        years=args.years,
+        rows=args.rows,
+        target_mb=args.size_mb,
+        duplicates=args.duplicates,
+        seed=args.seed,
+        bad_values=args.bad_values,
+    )
+    print(f"Generated {total} rows into {args.filename}")
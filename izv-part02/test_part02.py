@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Skript pro automaticke testovani pomocnych casti druhe casti projektu.
+
+Spousteni:
+   pytest
+nebo
+   python3 -m pytest
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+import analysis
+from analysis import count_periods
+from dedup import DedupIndex
+from synthetic import generate_data
+
+
+def make_chunks(n_chunks=5, size=1000, seed=0):
+    """Vytvori chunky s opakujicimi se id uvnitr chunku i mezi nimi"""
+    rng = np.random.default_rng(seed)
+    return [
+        pd.DataFrame({
+            "p1": rng.integers(0, 2000, size),
+            "row": np.arange(i * size, (i + 1) * size),
+        })
+        for i in range(n_chunks)
+    ]
+
+
+def test_dedup_first_occurrence():
+    """Test masky prvnich vyskytu id napric davkami"""
+    index = DedupIndex()
+    assert index.first_occurrence([5, 3, 5, 7]).tolist() == [
+        True, True, False, True
+    ]
+    assert index.first_occurrence([7, 8, 3, 8]).tolist() == [
+        False, True, False, False
+    ]
+    assert len(index) == 4
+    assert index.contains([3, 4, 8]).tolist() == [True, False, True]
+
+
+def test_dedup_drop_duplicates():
+    """Test shody s drop_duplicates(subset="p1") nad celymi daty"""
+    chunks = make_chunks()
+    index = DedupIndex()
+    result = pd.concat(
+        [index.drop_duplicates(chunk) for chunk in chunks], ignore_index=True
+    )
+    expected = pd.concat(chunks, ignore_index=True).drop_duplicates(
+        subset="p1"
+    ).reset_index(drop=True)
+
+    # vyhrava prvni vyskyt, zachova se tedy i poradi radku
+    pd.testing.assert_frame_equal(result, expected)
+    assert len(index) == expected["p1"].nunique()
+    assert index.nbytes == 8 * len(index)
+
+
+@pytest.fixture(scope="module")
+def archive(tmp_path_factory):
+    """Synteticky archiv s duplicitami a chybnymi hodnotami ("A:")"""
+    filename = tmp_path_factory.mktemp("data") / "data.zip"
+    generate_data(str(filename), years=3, rows=1400, bad_values=0.005)
+    return str(filename)
+
+
+def test_load_parsed_data(archive, tmp_path):
+    """Test shody vsech cest nacitani s parse_data(load_data(...))"""
+    expected = analysis.parse_data(analysis.load_data(archive))
+    # desetinne carky ve sloupcich s chybnou hodnotou se nesmi ztratit
+    assert expected["a"].notna().mean() > 0.98
+
+    result = analysis.load_parsed_data(archive)
+    pd.testing.assert_frame_equal(result, expected)
+
+    result = analysis.load_parsed_data(archive, cache_dir=str(tmp_path))
+    pd.testing.assert_frame_equal(result, expected)
+    result = analysis.load_parsed_data(archive, cache_dir=str(tmp_path))
+    pd.testing.assert_frame_equal(result, expected)
+
+    store = str(tmp_path / "store")
+    for _ in range(2):
+        result = analysis.load_data_incremental(archive, store)
+        pd.testing.assert_frame_equal(result, expected)
+
+
+@pytest.mark.parametrize("freq", ["D", "W", "M", "Q"])
+def test_count_periods(freq):
+    """Test shody poctu a popisku obdobi s pandas resample"""
+    rng = np.random.default_rng(1)
+    n = 5000
+    dates = pd.Series(
+        pd.Timestamp("2021-01-01")
+        + pd.to_timedelta(rng.integers(0, 3 * 365, n), unit="D")
+        + pd.to_timedelta(rng.integers(0, 24, n), unit="h")
+    )
+    groups = pd.Series(rng.choice(["JHM", "PHA", "STC"], n))
+    cats = pd.Series(rng.choice(["a", "b"], n))
+
+    counts, group_order, periods, cat_order = count_periods(
+        dates, groups, cats, freq
+    )
+    assert group_order == ["JHM", "PHA", "STC"]
+    assert cat_order == ["a", "b"]
+    # popisky jsou posledni dny obdobi (tydny konci nedeli)
+    assert (periods == periods.normalize()).all()
+    if freq == "W":
+        assert (periods.dayofweek == 6).all()
+    if freq in ("M", "Q"):
+        assert periods.is_month_end.all()
+
+    for gi, group in enumerate(group_order):
+        for ci, cat in enumerate(cat_order):
+            mask = (groups == group) & (cats == cat)
+            expected = (
+                pd.Series(1, index=dates[mask]).resample(freq).sum()
+                .reindex(periods, fill_value=0)
+            )
+            assert (counts[gi, :, ci] == expected.to_numpy()).all()
+    assert counts.sum() == n
+
+
+def test_count_periods_window():
+    """Test okna obdobi s chybejicimi hodnotami a vahami"""
+    dates = pd.Series(pd.to_datetime(
+        ["2022-01-15", "2022-03-02", None, "2022-03-31", "2022-07-01"]
+    ))
+    groups = pd.Series(["A", "A", "A", None, "A"])
+    cats = pd.Series([1, 2, 1, 1, 1])
+
+    counts, _, periods, _ = count_periods(
+        dates, groups, cats, "M", start="2021-12-10", end="2022-04-01",
+        weights=[1, 2, 3, 4, 5],
+    )
+    assert list(periods.strftime("%Y-%m-%d")) == [
+        "2021-12-31", "2022-01-31", "2022-02-28", "2022-03-31", "2022-04-30"
+    ]
+    assert counts[0, :, 0].tolist() == [0, 1, 0, 0, 0]
+    assert counts[0, :, 1].tolist() == [0, 0, 0, 2, 0]
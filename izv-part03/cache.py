@@ -0,0 +1,31 @@
+#!/usr/bin/python3.10
+# coding=utf-8
+
+# Author: Lukas Vecerka (xvecer30)
+
+import pandas as pd
+from izvcache import data_cache_file, read_frame, write_frame
+
+# bump whenever the cached representation changes, invalidates cache
+CACHE_VERSION = 1
+
+
+def read_pickle_cached(
+    filename: str, cache_dir: str = None
+) -> pd.DataFrame:
+    """
+    Function that reads pickled DataFrame through a Parquet cache keyed
+    by content hash of the pickle.
+    :param filename: Path to the pickled DataFrame (e.g. accidents.pkl.gz)
+    :param cache_dir: Directory with cached files, None disables cache
+    :return: DataFrame with accidents
+    """
+    if cache_dir is None:
+        return pd.read_pickle(filename)
+
+    cache_file = data_cache_file(cache_dir, filename, "pickle", CACHE_VERSION)
+    df = read_frame(cache_file)
+    if df is None:
+        df = pd.read_pickle(filename)
+        write_frame(cache_file, df)
+    return df
@@ -8,6 +8,7 @@ import numpy as np
 import matplotlib.pyplot as plt
 import seaborn as sns
 from sklearn.linear_model import LogisticRegression
+from cache import read_pickle_cached
 
 
 def convert_two_digit_year_to_four_digit(year_str, cutoff="23"):
@@ -116,7 +117,7 @@ tech_issue_type_map = {
 }
 
 # Load the data
-df = pd.read_pickle("accidents.pkl.gz")
+df = read_pickle_cached("accidents.pkl.gz", cache_dir=".izv_cache")
 df.set_index("p1", inplace=True)
 
 # Filter the car accidents only
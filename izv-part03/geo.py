@@ -3,78 +3,188 @@
 
 # Author: Lukas Vecerka (xvecer30)
 
+import os
+import numpy as np
 import pandas as pd
 import geopandas
+import shapely
+from pyproj import Transformer
 import matplotlib.pyplot as plt
-import contextily as ctx
 import sklearn.cluster as cluster
 import matplotlib as mpl
 from shapely.geometry import MultiPoint
+from spatial import GridIndex
+from tiles import TILE_DIR, add_basemap
+from izvcache import atomic_file, figure_key, load_figure, store_figure
+from cache import read_pickle_cached
 
 
-def make_geo(df: pd.DataFrame) -> geopandas.GeoDataFrame:
+# bounds of the Czech Republic in S-JTSK (EPSG:5514), d is x and e is y
+CZ_BOUNDS_X = (-905000.0, -431000.0)
+CZ_BOUNDS_Y = (-1227000.0, -935000.0)
+
+# columns with Web Mercator (EPSG:3857) coordinates added by make_geo
+MERCATOR_COLUMNS = ["x_merc", "y_merc"]
+
+_TO_MERCATOR = Transformer.from_crs("EPSG:5514", "EPSG:3857", always_xy=True)
+
+
+def make_geo(
+    df: pd.DataFrame, mercator: bool = False, validate: bool = False
+) -> geopandas.GeoDataFrame:
     """
     Function that creates GeoDataFrame from DataFrame with accidents.
     :param df: DataFrame with accidents
+    :param mercator: If True, Web Mercator coordinates are computed once in
+        x_merc and y_merc columns, plots then do not reproject
+    :param validate: If True, accidents outside of the Czech Republic are
+        dropped, including those with swapped d and e (they are outside too)
     :return: GeoDataFrame with accidents
     """
     df = df.dropna(subset=["d", "e"])
+    if validate:
+        inside = df["d"].between(*CZ_BOUNDS_X) & df["e"].between(*CZ_BOUNDS_Y)
+        df = df[inside]
+
     gdf = geopandas.GeoDataFrame(
         df, geometry=geopandas.points_from_xy(df.d, df.e), crs="EPSG:5514"
     )
+    if mercator:
+        x, y = _TO_MERCATOR.transform(
+            gdf["d"].to_numpy(np.float64), gdf["e"].to_numpy(np.float64)
+        )
+        gdf[MERCATOR_COLUMNS[0]] = x
+        gdf[MERCATOR_COLUMNS[1]] = y
     return gdf
 
 
+def make_index(
+    gdf: geopandas.GeoDataFrame, cell_size: float = None
+) -> GridIndex:
+    """
+    Function that builds grid index of accidents, over Web Mercator
+    coordinates of make_geo(mercator=True) or over the geometry.
+    :param gdf: GeoDataFrame with accidents
+    :param cell_size: Size of a cell in units of the coordinates
+    :return: Index whose queries return positions of rows of gdf
+    """
+    if set(MERCATOR_COLUMNS) <= set(gdf.columns):
+        x = gdf[MERCATOR_COLUMNS[0]].to_numpy()
+        y = gdf[MERCATOR_COLUMNS[1]].to_numpy()
+    else:
+        x = gdf.geometry.x.to_numpy()
+        y = gdf.geometry.y.to_numpy()
+    return GridIndex(x, y, cell_size)
+
+
+def _to_mercator(gdf: geopandas.GeoDataFrame) -> geopandas.GeoDataFrame:
+    # points in EPSG:3857, from precomputed columns when make_geo made them
+    if set(MERCATOR_COLUMNS) <= set(gdf.columns):
+        return geopandas.GeoDataFrame(
+            gdf,
+            geometry=geopandas.points_from_xy(
+                gdf[MERCATOR_COLUMNS[0]], gdf[MERCATOR_COLUMNS[1]]
+            ),
+            crs="EPSG:3857",
+        )
+    return gdf.to_crs(epsg=3857)
+
+
+def _figure_cache_key(
+    cache_dir: str, fig_location: str, show_figure: bool, name: str, *parts
+) -> str:
+    # key of the figure in figure cache, None when the figure is not cached
+    # (no cache, figure is not saved or it is shown and has to be drawn)
+    if cache_dir is None or fig_location is None or show_figure:
+        return None
+    return figure_key(name, *parts)
+
+
+def _centers_file(cache_dir: str, key: str) -> str:
+    # centers returned by plot_cluster are cached next to its figure
+    return os.path.join(cache_dir, "figures", f"{key}-centers.npy")
+
+
+def _load_centers(cache_dir: str, key: str) -> np.ndarray:
+    centers_file = _centers_file(cache_dir, key)
+    try:
+        centers = np.load(centers_file)
+    except (FileNotFoundError, OSError, ValueError):
+        return None
+    # refresh mtime, eviction removes the least recently used files
+    os.utime(centers_file)
+    return centers
+
+
+def _store_centers(cache_dir: str, key: str, centers: np.ndarray):
+    centers_file = _centers_file(cache_dir, key)
+    os.makedirs(os.path.dirname(centers_file), exist_ok=True)
+    with atomic_file(centers_file) as tmp_file:
+        with open(tmp_file, "wb") as f:
+            np.save(f, centers)
+
+
+def _points(gdf: geopandas.GeoDataFrame) -> pd.DataFrame:
+    # coordinates of point geometries, hashed as data of a figure
+    return pd.DataFrame({"x": gdf.geometry.x, "y": gdf.geometry.y})
+
+
 def plot_geo(
     gdf: geopandas.GeoDataFrame,
     fig_location: str = None,
-    show_figure: bool = False
+    show_figure: bool = False,
+    region: str = "JHM",
+    cache_dir: str = None,
+    tile_dir: str = TILE_DIR,
 ):
     """
-    Function that plots accidents caused by animals in JHM region in 2021
-    and 2022.
+    Function that plots accidents caused by animals in region (JHM by
+    default) in 2021 and 2022.
     :param gdf: GeoDataFrame with accidents
     :param fig_location: Location where to save figure
     :param show_figure: If True, figure is shown
+    :param region: Region to plot
+    :param cache_dir: Directory with cached figures, None disables cache
+    :param tile_dir: Directory of the basemap tile store (see tiles.py)
     """
-    gdf_2 = gdf.copy()
-    gdf_2 = gdf_2[(gdf_2["region"] == "JHM") & (gdf_2["p10"] == 4)]
+    gdf_2 = gdf[(gdf["region"] == region) & (gdf["p10"] == 4)].copy()
     gdf_2["date"] = pd.to_datetime(gdf_2["p2a"])
 
     gdf_2021 = gdf_2[gdf_2["date"].dt.year == 2021]
     gdf_2022 = gdf_2[gdf_2["date"].dt.year == 2022]
 
-    gdf_2021 = gdf_2021.to_crs(epsg=3857)
-    gdf_2022 = gdf_2022.to_crs(epsg=3857)
+    key = _figure_cache_key(
+        cache_dir, fig_location, show_figure, "plot_geo", region,
+        _points(gdf_2021), _points(gdf_2022)
+    )
+    if key is not None and load_figure(cache_dir, key, fig_location):
+        return
+
+    gdf_2021 = _to_mercator(gdf_2021)
+    gdf_2022 = _to_mercator(gdf_2022)
 
     fig, axes = plt.subplots(1, 2, figsize=(15, 8), sharex=True, sharey=True)
 
     # Plotting for 2021
     gdf_2021.plot(ax=axes[0], color="blue", markersize=5)
-    ctx.add_basemap(
-        axes[0],
-        crs=gdf_2021.crs.to_string(),
-        source=ctx.providers.OpenStreetMap.Mapnik,
-        alpha=0.9,
-    )
-    axes[0].set_title("JHM kraj (2021)")
+    missing = add_basemap(axes[0], alpha=0.9, tile_dir=tile_dir)
+    axes[0].set_title(f"{region} kraj (2021)")
     axes[0].set_axis_off()
 
     # Plotting for 2022
     gdf_2022.plot(ax=axes[1], color="red", markersize=5)
-    ctx.add_basemap(
-        axes[1],
-        crs=gdf_2022.crs.to_string(),
-        source=ctx.providers.OpenStreetMap.Mapnik,
-        alpha=0.9,
-    )
-    axes[1].set_title("JHM kraj (2022)")
+    missing += add_basemap(axes[1], alpha=0.9, tile_dir=tile_dir)
+    axes[1].set_title(f"{region} kraj (2022)")
     axes[1].set_axis_off()
 
     plt.tight_layout()
 
     if fig_location is not None:
         fig.savefig(fig_location)
+        # figure with missing tiles would be served even after the tiles
+        # are seeded, so only figures with complete basemap are cached
+        if key is not None and missing == 0:
+            store_figure(cache_dir, key, fig_location)
 
     if show_figure:
         plt.show()
@@ -82,48 +192,140 @@ def plot_geo(
         plt.close(fig)
 
 
+def _in_region(gdf: geopandas.GeoDataFrame, region: str) -> pd.Series:
+    # mask of accidents in region, None selects the whole country
+    if region is None:
+        return pd.Series(True, index=gdf.index)
+    return gdf["region"] == region
+
+
+def cluster_points(
+    coords: np.ndarray,
+    n_clusters: int = 12,
+    seed: int = None,
+    minibatch: bool = False,
+    init: np.ndarray = None,
+    batch_size: int = 4096,
+) -> tuple:
+    """
+    Function that clusters points by KMeans.
+    :param coords: Array of shape (n, 2) with coordinates of points
+    :param n_clusters: Number of clusters (at most number of points)
+    :param seed: Seed of the initialization, None for random one
+    :param minibatch: If True, MiniBatchKMeans is used, it scales to all
+        accidents of the country
+    :param init: Centers of a previous run to start from (warm start)
+    :param batch_size: Size of batches of MiniBatchKMeans
+    :return: Cluster of every point and centers of clusters
+    """
+    n_clusters = min(n_clusters, len(coords))
+    if init is not None:
+        init = np.asarray(init, dtype=np.float64)[:n_clusters]
+        n_init = 1
+    else:
+        init = "k-means++"
+        n_init = 3 if minibatch else 10
+
+    if minibatch:
+        model = cluster.MiniBatchKMeans(
+            n_clusters=n_clusters,
+            init=init,
+            n_init=n_init,
+            random_state=seed,
+            batch_size=batch_size,
+        )
+    else:
+        model = cluster.KMeans(
+            n_clusters=n_clusters, init=init, n_init=n_init, random_state=seed
+        )
+    labels = model.fit_predict(coords)
+    return labels, model.cluster_centers_
+
+
 def plot_cluster(
     gdf: geopandas.GeoDataFrame,
     fig_location: str = None,
-    show_figure: bool = False
-):
+    show_figure: bool = False,
+    region: str = "JHM",
+    cache_dir: str = None,
+    index: GridIndex = None,
+    n_clusters: int = 12,
+    seed: int = None,
+    minibatch: bool = False,
+    init: np.ndarray = None,
+    tile_dir: str = TILE_DIR,
+) -> np.ndarray:
     """
     Function which plots clusters of accidents where alcohol
-    was involved in JHM.
+    was involved in region (JHM by default).
     :param gdf: GeoDataFrame with accidents
     :param fig_location: Location where to save figure
     :param show_figure: If True, figure is shown
+    :param region: Region to plot, None for the whole country
+    :param cache_dir: Directory with cached figures, None disables cache
+    :param index: Index of gdf from make_index over Web Mercator columns
+        of make_geo(mercator=True), bounding box of the region is then
+        searched in the index instead of testing every accident
+    :param n_clusters: Number of clusters
+    :param seed: Seed of clustering, None for random one
+    :param minibatch: If True, MiniBatchKMeans is used
+    :param init: Centers returned by a previous call to start from
+    :param tile_dir: Directory of the basemap tile store (see tiles.py)
+    :return: Centers of clusters (cached with the figure)
     """
-    gdf_3 = gdf.copy()
-    gdf_3 = gdf_3[(gdf_3["region"] == "JHM") & (gdf_3["p11"] >= 4)]
-
-    gdf_jhm = gdf[(gdf["region"] == "JHM") & (gdf["date"].dt.year == 2021)]
-
-    gdf_jhm = gdf_jhm.to_crs(epsg=3857)
-    gdf_3 = gdf_3.to_crs(epsg=3857)
-
-    gdf_3 = geopandas.clip(gdf_3, gdf_jhm.total_bounds)
+    if index is not None and not set(MERCATOR_COLUMNS) <= set(gdf.columns):
+        raise ValueError("index needs gdf from make_geo(mercator=True)")
+
+    gdf_jhm = gdf[_in_region(gdf, region) & (gdf["date"].dt.year == 2021)]
+    gdf_jhm = _to_mercator(gdf_jhm)
+
+    # points inside the bounds of all accidents in the region, the same
+    # as clip to the bounding box
+    min_x, min_y, max_x, max_y = gdf_jhm.total_bounds
+    if index is not None:
+        gdf_3 = gdf.iloc[index.bbox(min_x, min_y, max_x, max_y)]
+        gdf_3 = _to_mercator(
+            gdf_3[_in_region(gdf_3, region) & (gdf_3["p11"] >= 4)]
+        )
+    else:
+        gdf_3 = _to_mercator(
+            gdf[_in_region(gdf, region) & (gdf["p11"] >= 4)]
+        )
+        gdf_3 = gdf_3[
+            gdf_3.geometry.x.between(min_x, max_x)
+            & gdf_3.geometry.y.between(min_y, max_y)
+        ]
+    gdf_3 = gdf_3.copy()
+
+    key = _figure_cache_key(
+        cache_dir, fig_location, show_figure, "plot_cluster", region,
+        _points(gdf_3), n_clusters, seed, minibatch, init
+    )
+    if key is not None:
+        # warm start chains need the centers of a cached figure too
+        centers = _load_centers(cache_dir, key)
+        if centers is not None and load_figure(cache_dir, key, fig_location):
+            return centers
 
-    coords = gdf_3.geometry.apply(lambda geom: (geom.x, geom.y)).tolist()
+    # contiguous (n, 2) float64 array straight from the geometry array
+    coords = shapely.get_coordinates(gdf_3.geometry.array)
 
-    kmeans = cluster.KMeans(n_clusters=12, n_init=10)
-    gdf_3["cluster"] = kmeans.fit_predict(coords)
+    labels, centers = cluster_points(
+        coords, n_clusters, seed=seed, minibatch=minibatch, init=init
+    )
+    gdf_3["cluster"] = labels
 
-    accident_counts = gdf_3["cluster"].value_counts()
+    accident_counts = np.bincount(labels, minlength=len(centers))
     max_accidents = accident_counts.max()
 
     norm = mpl.colors.Normalize(vmin=0, vmax=max_accidents)
 
     colormap = mpl.colormaps["viridis"]
 
-    gdf_3["color"] = gdf_3["cluster"].apply(
-        lambda x: colormap(norm(accident_counts[x]))
-    )
-
     fig, ax = plt.subplots(figsize=(15, 12))
 
-    for cluster_id in range(12):
-        cluster_gdf = gdf_3[gdf_3["cluster"] == cluster_id]
+    for cluster_id in range(len(centers)):
+        cluster_gdf = gdf_3[labels == cluster_id]
         if not cluster_gdf.geometry.empty:
             multipoint = MultiPoint(cluster_gdf.geometry.tolist())
             polygon = multipoint.convex_hull
@@ -134,7 +336,9 @@ def plot_cluster(
             ax.scatter(
                 cluster_gdf.geometry.x,
                 cluster_gdf.geometry.y,
-                color=mpl.colors.to_hex(cluster_gdf["color"].iloc[0]),
+                color=mpl.colors.to_hex(
+                    colormap(norm(accident_counts[cluster_id]))
+                ),
                 label=f"Cluster {cluster_id}",
                 s=5,
             )
@@ -149,26 +353,188 @@ def plot_cluster(
         pad=0.05,
     )
 
-    ctx.add_basemap(
-        ax,
-        crs=gdf_3.crs.to_string(),
-        source=ctx.providers.OpenStreetMap.Mapnik,
-        alpha=0.9,
+    missing = add_basemap(ax, alpha=0.9, tile_dir=tile_dir)
+
+    ax.set_axis_off()
+
+    if fig_location is not None:
+        fig.savefig(fig_location)
+        if key is not None and missing == 0:
+            _store_centers(cache_dir, key, centers)
+            store_figure(cache_dir, key, fig_location)
+
+    if show_figure:
+        plt.show()
+    else:
+        plt.close(fig)
+
+    return centers
+
+
+def find_hotspots(
+    gdf: geopandas.GeoDataFrame,
+    eps: float = 300.0,
+    min_samples: int = 10,
+    cell_size: float = None,
+    method: str = "dbscan",
+) -> geopandas.GeoDataFrame:
+    """
+    Function that finds hotspots of accidents by density based clustering,
+    number of hotspots is given by data.
+    :param gdf: GeoDataFrame with accidents in metric CRS (EPSG:5514 of
+        make_geo), eps and cell_size are in its units
+    :param eps: Maximal distance of neighbouring accidents in a hotspot
+    :param min_samples: Minimal number of accidents around a core accident
+    :param cell_size: DBSCAN runs on a grid of cells of this size (eps / 4
+        by default) weighted by number of accidents in a cell, so memory
+        grows with number of occupied cells, 0 clusters accidents directly
+    :param method: "dbscan" (kd-tree neighbour search) or "hdbscan"
+        (accidents directly, min_samples is the minimal hotspot size)
+    :return: GeoDataFrame with hotspot id, count of accidents and convex
+        hull of the hotspot, sorted by count
+    """
+    coords = shapely.get_coordinates(gdf.geometry.array)
+    if cell_size is None:
+        cell_size = eps / 4
+
+    if len(coords) == 0:
+        labels = np.empty(0, dtype=np.int64)
+    elif method == "hdbscan":
+        labels = cluster.HDBSCAN(min_cluster_size=min_samples).fit_predict(
+            coords
+        )
+    elif method != "dbscan":
+        raise ValueError(f"unknown method {method}")
+    elif cell_size > 0:
+        # hash accidents into grid cells, one weighted point per cell
+        cells = np.floor((coords - coords.min(axis=0)) / cell_size)
+        cells = cells.astype(np.int64)
+        keys = cells[:, 0] * (cells[:, 1].max() + 1) + cells[:, 1]
+        _, inverse, counts = np.unique(
+            keys, return_inverse=True, return_counts=True
+        )
+        centers = np.column_stack(
+            [np.bincount(inverse, coords[:, i]) / counts for i in range(2)]
+        )
+        cell_labels = cluster.DBSCAN(
+            eps=eps, min_samples=min_samples, algorithm="kd_tree"
+        ).fit_predict(centers, sample_weight=counts)
+        labels = cell_labels[inverse]
+    else:
+        labels = cluster.DBSCAN(
+            eps=eps, min_samples=min_samples, algorithm="kd_tree"
+        ).fit_predict(coords)
+
+    # noise has label -1, hulls are built from accidents sorted by hotspot
+    order = np.argsort(labels, kind="stable")
+    order = order[labels[order] >= 0]
+    counts = np.bincount(labels[order])
+    hulls = shapely.convex_hull(
+        shapely.multipoints(coords[order], indices=labels[order])
+    )
+    # hotspots on a line or in one point get an area around them
+    flat = shapely.get_type_id(hulls) != 3
+    hulls[flat] = shapely.buffer(hulls[flat], max(cell_size, eps / 4))
+
+    hotspots = geopandas.GeoDataFrame(
+        {"hotspot": np.arange(len(counts)), "count": counts},
+        geometry=hulls,
+        crs=gdf.crs,
+    )
+    return hotspots.sort_values("count", ascending=False, ignore_index=True)
+
+
+def plot_hotspots(
+    gdf: geopandas.GeoDataFrame,
+    fig_location: str = None,
+    show_figure: bool = False,
+    region: str = None,
+    alcohol: bool = True,
+    eps: float = 300.0,
+    min_samples: int = 10,
+    cache_dir: str = None,
+    tile_dir: str = TILE_DIR,
+) -> geopandas.GeoDataFrame:
+    """
+    Function which plots hotspots of accidents (with alcohol by default)
+    in region or in the whole country.
+    :param gdf: GeoDataFrame with accidents
+    :param fig_location: Location where to save figure
+    :param show_figure: If True, figure is shown
+    :param region: Region to plot, None for the whole country
+    :param alcohol: If True, only accidents with alcohol (p11 >= 4)
+    :param eps: Maximal distance of neighbouring accidents in meters
+    :param min_samples: Minimal number of accidents around a core accident
+    :param cache_dir: Directory with cached figures, None disables cache
+    :param tile_dir: Directory of the basemap tile store (see tiles.py)
+    :return: Hotspots from find_hotspots
+    """
+    mask = _in_region(gdf, region)
+    if alcohol:
+        mask &= gdf["p11"] >= 4
+    gdf_h = gdf[mask]
+
+    hotspots = find_hotspots(gdf_h, eps, min_samples)
+    hotspots_merc = hotspots.to_crs(epsg=3857)
+
+    key = _figure_cache_key(
+        cache_dir, fig_location, show_figure, "plot_hotspots", region,
+        alcohol, eps, min_samples, _points(gdf_h)
+    )
+    if key is not None and load_figure(cache_dir, key, fig_location):
+        return hotspots
+
+    fig, ax = plt.subplots(figsize=(15, 12))
+    points = _to_mercator(gdf_h)
+    ax.scatter(
+        points.geometry.x, points.geometry.y, color="gray", s=2, alpha=0.5
+    )
+
+    colormap = mpl.colormaps["viridis"]
+    norm = mpl.colors.Normalize(
+        vmin=0, vmax=hotspots["count"].max() if len(hotspots) else 1
     )
+    if len(hotspots):
+        hotspots_merc.plot(
+            ax=ax,
+            color=[colormap(norm(count)) for count in hotspots["count"]],
+            alpha=0.6,
+            edgecolor="black",
+        )
+
+    sm = plt.cm.ScalarMappable(cmap=colormap, norm=norm)
+    plt.colorbar(
+        sm,
+        ax=ax,
+        label="Počet nehod v úseku",
+        orientation="horizontal",
+        fraction=0.062,
+        pad=0.05,
+    )
+
+    missing = add_basemap(ax, alpha=0.9, tile_dir=tile_dir)
 
     ax.set_axis_off()
 
     if fig_location is not None:
         fig.savefig(fig_location)
+        if key is not None and missing == 0:
+            store_figure(cache_dir, key, fig_location)
 
     if show_figure:
         plt.show()
     else:
         plt.close(fig)
 
+    return hotspots
+
 
 if __name__ == "__main__":
     # zde muzete delat libovolne modifikace
-    gdf = make_geo(pd.read_pickle("accidents.pkl.gz"))
+    gdf = make_geo(
+        read_pickle_cached("accidents.pkl.gz", cache_dir=".izv_cache"),
+        mercator=True,
+        validate=True,
+    )
     plot_geo(gdf, "geo1.png", True)
     plot_cluster(gdf, "geo3.png", True)
@@ -0,0 +1,237 @@
+#!/usr/bin/python3.10
+# coding=utf-8
+
+# Author: Lukas Vecerka (xvecer30)
+
+"""
+Batch renderer of all analysis (part 2) and geo (part 3) figures.
+
+Figures are rendered in a process pool with the Agg backend. Datasets are
+loaded once before the pool is started, with fork start method workers
+inherit them, otherwise every worker loads them once from the cache, so
+no dataset is pickled for a figure.
+
+Usage (cache helpers shared by both parts are installed once):
+    pip install -e ../izv-common
+    python report.py --data ../izv-part02/data.zip \\
+        --accidents accidents.pkl.gz --out figures --workers 16
+"""
+
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, List, Tuple
+
+import matplotlib
+
+matplotlib.use("Agg")
+
+import geo  # noqa: E402
+from cache import read_pickle_cached  # noqa: E402
+
+FIGURES = [
+    "state", "alcohol", "fault", "profile", "geo", "cluster", "hotspots"
+]
+
+# datasets shared by all figures rendered in a process
+_DATASETS: Dict[str, object] = {}
+
+# analysis module of part 2, next to this part in the repository
+PART02_DIR = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "..", "izv-part02"
+)
+
+
+def _analysis():
+    # part 2 is imported only for analysis figures, geo figures and the
+    # geo module itself do not need it
+    if PART02_DIR not in sys.path:
+        sys.path.append(PART02_DIR)
+    import analysis
+
+    return analysis
+
+
+def load_datasets(
+    data: str = None, accidents: str = None, cache_dir: str = None
+) -> Dict[str, object]:
+    """
+    Function that loads datasets needed by the figures.
+    :param data: Path to data.zip for analysis figures
+    :param accidents: Path to accidents.pkl.gz for geo figures
+    :param cache_dir: Directory with cached datasets
+    :return: Dictionary with aggregate cube and GeoDataFrame
+    """
+    datasets = {}
+    if data is not None:
+        analysis = _analysis()
+        df = analysis.load_parsed_data(
+            data,
+            cache_dir=cache_dir,
+            columns=["date", "p57", "p11", "p10", "p2b"],
+        )
+        datasets["cube"] = analysis.build_cube(df)
+    if accidents is not None:
+        # projected once, geo figures only filter rows
+        datasets["gdf"] = geo.make_geo(
+            read_pickle_cached(accidents, cache_dir=cache_dir),
+            mercator=True,
+            validate=True,
+        )
+    return datasets
+
+
+def _init_worker(data: str, accidents: str, cache_dir: str):
+    matplotlib.use("Agg")
+    if not _DATASETS:
+        # spawned worker did not inherit datasets, load them from cache
+        _DATASETS.update(load_datasets(data, accidents, cache_dir))
+
+
+def _render(
+    job: Tuple[str, str, str, Dict], out_dir: str, cache_dir: str
+) -> str:
+    name, dataset, func_name, kwargs = job
+    module = _analysis() if dataset == "cube" else geo
+    fig_location = os.path.join(out_dir, f"{name}.png")
+    getattr(module, func_name)(
+        _DATASETS[dataset], fig_location, False, cache_dir=cache_dir,
+        **kwargs
+    )
+    return fig_location
+
+
+def make_jobs(
+    figures: List[str], regions: List[str], datasets: Dict[str, object]
+) -> List[Tuple[str, str, str, Dict]]:
+    """
+    Function that creates list of figures to render.
+    :param figures: Names of figures (state, alcohol, fault, profile, geo,
+        cluster, hotspots)
+    :param regions: Regions for per region variants
+    :param datasets: Loaded datasets, figures without data are skipped
+    :return: List of (name, dataset, function, kwargs) jobs
+    """
+    jobs = []
+    if "cube" in datasets:
+        if "state" in figures:
+            jobs.append(("state", "cube", "plot_state", {}))
+        if "profile" in figures:
+            jobs.append(("profile", "cube", "plot_profile", {}))
+        for figure in ["alcohol", "fault"]:
+            if figure not in figures:
+                continue
+            func_name = f"plot_{figure}"
+            jobs.append((figure, "cube", func_name, {}))
+            for region in regions:
+                jobs.append((
+                    f"{figure}_{region}",
+                    "cube",
+                    func_name,
+                    {"regions": [region]},
+                ))
+    if "gdf" in datasets:
+        for figure in ["geo", "cluster", "hotspots"]:
+            if figure not in figures:
+                continue
+            for region in regions:
+                jobs.append((
+                    f"{figure}_{region}",
+                    "gdf",
+                    f"plot_{figure}",
+                    {"region": region},
+                ))
+    return jobs
+
+
+def render_report(
+    out_dir: str,
+    data: str = None,
+    accidents: str = None,
+    figures: List[str] = None,
+    regions: List[str] = None,
+    workers: int = None,
+    cache_dir: str = None,
+) -> List[str]:
+    """
+    Function that renders all requested figures in a process pool.
+    :param out_dir: Directory for rendered PNG files
+    :param data: Path to data.zip for analysis figures
+    :param accidents: Path to accidents.pkl.gz for geo figures
+    :param figures: Names of figures, all if None
+    :param regions: Regions for per region variants, all 14 (regions of
+        accidents for geo figures only) if None
+    :param workers: Number of processes, number of CPUs if None
+    :param cache_dir: Directory with cached datasets and figures, unchanged
+        figures are copied from it instead of rendered
+    :return: List of rendered files
+    """
+    figures = figures or FIGURES
+    os.makedirs(out_dir, exist_ok=True)
+
+    _DATASETS.update(load_datasets(data, accidents, cache_dir))
+    if regions is None:
+        if "cube" in _DATASETS:
+            regions = list(_analysis().REGIONS)
+        elif "gdf" in _DATASETS:
+            regions = sorted(_DATASETS["gdf"]["region"].unique())
+        else:
+            regions = []
+    jobs = make_jobs(figures, regions, _DATASETS)
+
+    methods = multiprocessing.get_all_start_methods()
+    context = multiprocessing.get_context(
+        "fork" if "fork" in methods else "spawn"
+    )
+
+    rendered = []
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=context,
+        initializer=_init_worker,
+        initargs=(data, accidents, cache_dir),
+    ) as executor:
+        futures = {
+            executor.submit(_render, job, out_dir, cache_dir): job[0]
+            for job in jobs
+        }
+        for future in as_completed(futures):
+            try:
+                rendered.append(future.result())
+            except Exception:
+                print(f"Figure {futures[future]} failed:", file=sys.stderr)
+                traceback.print_exc()
+
+    return sorted(rendered)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--data", default=None,
+                        help="data.zip for analysis figures")
+    parser.add_argument("--accidents", default=None,
+                        help="accidents.pkl.gz for geo figures")
+    parser.add_argument("--out", default="figures")
+    parser.add_argument("--figures", nargs="+", choices=FIGURES,
+                        default=FIGURES)
+    parser.add_argument("--regions", nargs="+", default=None)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--cache-dir", default=".izv_cache")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    files = render_report(
+        args.out,
+        data=args.data,
+        accidents=args.accidents,
+        figures=args.figures,
+        regions=args.regions,
+        workers=args.workers,
+        cache_dir=args.cache_dir,
+    )
+    print(f"Rendered {len(files)} figures in "
+          f"{time.perf_counter() - start:.1f} s")
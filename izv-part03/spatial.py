@@ -0,0 +1,115 @@
+#!/usr/bin/python3.10
+# coding=utf-8
+
+# Author: Lukas Vecerka (xvecer30)
+
+import numpy as np
+import shapely
+
+
+class GridIndex:
+    """
+    Uniform grid index of points for bounding box, radius and polygon
+    queries. Points are sorted by their cell (row by row), so the cells of
+    one grid row inside a query box form a single contiguous slice and a
+    query only touches points of the cells it overlaps.
+    """
+
+    def __init__(self, x: np.ndarray, y: np.ndarray, cell_size: float = None):
+        """
+        Builds the index.
+        :param x: X coordinates of points
+        :param y: Y coordinates of points
+        :param cell_size: Size of a cell, by default about 16 points fall
+            into an occupied cell of uniformly spread points (along the
+            line for points on a line), it is enlarged so that the grid
+            has at most 4 cells per point
+        """
+        self.x = np.ascontiguousarray(x, dtype=np.float64)
+        self.y = np.ascontiguousarray(y, dtype=np.float64)
+        n = len(self.x)
+
+        self.min_x = self.x.min() if n else 0.0
+        self.min_y = self.y.min() if n else 0.0
+        width = (self.x.max() - self.min_x) if n else 0.0
+        height = (self.y.max() - self.min_y) if n else 0.0
+        if cell_size is None:
+            # area of collinear points (a road, thin slice of a region) is
+            # about zero, their cells are sized by the length of the line
+            cell_size = max(
+                np.sqrt(max(width * height, 1.0) * 16 / max(n, 1)),
+                max(width, height) * 16 / max(n, 1),
+            )
+        cell_size = max(float(cell_size), 1e-9)
+        # offsets have an item per cell, too fine grid would waste memory
+        max_cells = 4 * max(n, 256)
+        while (width // cell_size + 1) * (height // cell_size + 1) > max_cells:
+            cell_size *= 2
+        self.cell_size = cell_size
+        self.nx = int(width // self.cell_size) + 1
+        self.ny = int(height // self.cell_size) + 1
+
+        cells = self._cell_x(self.x) + self._cell_y(self.y) * self.nx
+        self.order = np.argsort(cells, kind="stable")
+        # offsets[c]:offsets[c + 1] are positions in order of points of
+        # cell c
+        self.offsets = np.searchsorted(
+            cells[self.order], np.arange(self.nx * self.ny + 1)
+        )
+
+    def __len__(self) -> int:
+        return len(self.x)
+
+    def _cell_x(self, x) -> np.ndarray:
+        cell = np.floor((np.asarray(x) - self.min_x) / self.cell_size)
+        return np.clip(cell, 0, self.nx - 1).astype(np.int64)
+
+    def _cell_y(self, y) -> np.ndarray:
+        cell = np.floor((np.asarray(y) - self.min_y) / self.cell_size)
+        return np.clip(cell, 0, self.ny - 1).astype(np.int64)
+
+    def _candidates(
+        self, min_x: float, min_y: float, max_x: float, max_y: float
+    ) -> np.ndarray:
+        # points of all cells overlapping the box
+        if len(self) == 0 or min_x > max_x or min_y > max_y:
+            return np.empty(0, dtype=np.int64)
+        cx0, cx1 = self._cell_x([min_x, max_x])
+        cy0, cy1 = self._cell_y([min_y, max_y])
+        rows = np.arange(cy0, cy1 + 1) * self.nx
+        starts = self.offsets[rows + cx0]
+        ends = self.offsets[rows + cx1 + 1]
+        slices = [self.order[s:e] for s, e in zip(starts, ends) if e > s]
+        if not slices:
+            return np.empty(0, dtype=np.int64)
+        return np.concatenate(slices)
+
+    def bbox(
+        self, min_x: float, min_y: float, max_x: float, max_y: float
+    ) -> np.ndarray:
+        """
+        Finds points inside a box (including its border).
+        :return: Sorted positions of the points
+        """
+        idx = self._candidates(min_x, min_y, max_x, max_y)
+        x, y = self.x[idx], self.y[idx]
+        inside = (x >= min_x) & (x <= max_x) & (y >= min_y) & (y <= max_y)
+        return np.sort(idx[inside])
+
+    def radius(self, x: float, y: float, r: float) -> np.ndarray:
+        """
+        Finds points at most r from the point x, y.
+        :return: Sorted positions of the points
+        """
+        idx = self._candidates(x - r, y - r, x + r, y + r)
+        inside = (self.x[idx] - x) ** 2 + (self.y[idx] - y) ** 2 <= r * r
+        return np.sort(idx[inside])
+
+    def polygon(self, polygon: shapely.Geometry) -> np.ndarray:
+        """
+        Finds points inside a polygon (in coordinates of the index).
+        :return: Sorted positions of the points
+        """
+        idx = self._candidates(*polygon.bounds)
+        inside = shapely.intersects_xy(polygon, self.x[idx], self.y[idx])
+        return np.sort(idx[inside])
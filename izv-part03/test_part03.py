@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Skript pro automaticke testovani prostoroveho indexu treti casti projektu.
+
+Spousteni:
+   pytest
+nebo
+   python3 -m pytest
+"""
+import io
+
+import matplotlib
+import numpy as np
+import pytest
+import requests
+import shapely
+from PIL import Image
+
+import tiles
+from spatial import GridIndex
+
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt  # noqa: E402
+
+
+def random_points(n=3000, seed=0):
+    """Body v obdelniku s nekolika shluky a duplicitnimi souradnicemi"""
+    rng = np.random.default_rng(seed)
+    x = np.concatenate([
+        rng.uniform(-5e4, 5e4, n),
+        rng.normal(1e4, 200.0, n // 3),
+        np.full(10, 123.0),
+    ])
+    y = np.concatenate([
+        rng.uniform(-3e4, 3e4, n),
+        rng.normal(-5e3, 200.0, n // 3),
+        np.full(10, -456.0),
+    ])
+    return x, y
+
+
+def check_queries(index, x, y, seed=1):
+    """Porovnani dotazu indexu s vyberem hrubou silou"""
+    rng = np.random.default_rng(seed)
+    for _ in range(30):
+        x0, x1 = np.sort(rng.uniform(x.min() - 1e3, x.max() + 1e3, 2))
+        y0, y1 = np.sort(rng.uniform(y.min() - 1e3, y.max() + 1e3, 2))
+        inside = (x >= x0) & (x <= x1) & (y >= y0) & (y <= y1)
+        assert (index.bbox(x0, y0, x1, y1) == np.flatnonzero(inside)).all()
+
+        cx, cy = x[rng.integers(len(x))], y[rng.integers(len(y))]
+        r = rng.uniform(0, 2e4)
+        inside = (x - cx) ** 2 + (y - cy) ** 2 <= r * r
+        assert (index.radius(cx, cy, r) == np.flatnonzero(inside)).all()
+
+        polygon = shapely.Point(cx, cy).buffer(r).union(
+            shapely.box(x0, y0, x1, y1)
+        )
+        inside = shapely.intersects_xy(polygon, x, y)
+        assert (index.polygon(polygon) == np.flatnonzero(inside)).all()
+
+
+@pytest.mark.parametrize("cell_size", [None, 50.0, 1e6])
+def test_grid_index_queries(cell_size):
+    """Test shody dotazu s hrubou silou pro ruzne velikosti bunek"""
+    x, y = random_points()
+    index = GridIndex(x, y, cell_size)
+    assert len(index) == len(x)
+    assert index.nx * index.ny <= 4 * max(len(x), 256)
+    check_queries(index, x, y)
+
+
+@pytest.mark.parametrize("angle", [0.0, 90.0, 30.0])
+def test_grid_index_collinear(angle):
+    """Test bodu na primce (silnice), mrizka nesmi byt degenerovana"""
+    rng = np.random.default_rng(2)
+    t = np.sort(rng.uniform(0, 1e5, 5000))
+    x = 1e5 + t * np.cos(np.radians(angle))
+    y = -1e6 + t * np.sin(np.radians(angle))
+    index = GridIndex(x, y)
+    assert index.nx * index.ny <= 4 * len(x)
+    if angle in (0.0, 90.0):
+        # bunky podle delky primky, ne jedna bunka pro vsechny body
+        assert max(index.nx, index.ny) > 100
+    check_queries(index, x, y)
+
+
+def test_grid_index_empty():
+    """Test prazdneho indexu"""
+    index = GridIndex(np.empty(0), np.empty(0))
+    assert len(index) == 0
+    assert len(index.bbox(0, 0, 1, 1)) == 0
+    assert len(index.radius(0, 0, 1)) == 0
+    assert len(index.polygon(shapely.box(0, 0, 1, 1))) == 0
+
+
+class TileSession:
+    """Nahrada requests.Session, vraci jednobarevne dlazdice nebo chybu"""
+
+    def __init__(self, error=None):
+        self.error = error
+        self.calls = 0
+        image = io.BytesIO()
+        Image.new("RGBA", (256, 256), (10, 20, 30, 255)).save(image, "png")
+        self.png = image.getvalue()
+
+    def get(self, url, headers=None, timeout=None):
+        self.calls += 1
+        if self.error is not None:
+            raise self.error
+        response = requests.Response()
+        response.status_code = 200
+        response._content = self.png
+        return response
+
+
+def test_basemap_offline(tmp_path, monkeypatch):
+    """Test podkladove mapy bez site ze zasobniku dlazdic"""
+    monkeypatch.setattr(tiles, "_offline", False)
+    assert tiles.seed_tiles([5, 6], str(tmp_path), session=TileSession()) > 0
+
+    # prvni mapa procesu bez site pouzije ulozeny zoom, neni prazdna
+    offline = TileSession(requests.ConnectionError("no network"))
+    monkeypatch.setattr(tiles.requests, "Session", lambda: offline)
+    for _ in range(2):
+        fig, ax = plt.subplots()
+        # vyrez zhruba Jihomoravskeho kraje
+        ax.set_xlim(1.72e6, 1.94e6)
+        ax.set_ylim(6.24e6, 6.4e6)
+        assert tiles.add_basemap(ax, tile_dir=str(tmp_path)) == 0
+        assert tiles._offline
+        plt.close(fig)
+    assert offline.calls == 1
@@ -0,0 +1,334 @@
+#!/usr/bin/python3.10
+# coding=utf-8
+
+# Author: Lukas Vecerka (xvecer30)
+#
+# Usage: python tiles.py --zoom 7 8 9 10
+#        python tiles.py --tile-dir /mnt/tiles --zoom 11 --max-mb 2048
+
+import argparse
+import math
+import os
+import time
+
+import numpy as np
+import matplotlib.colors as mcolors
+import contextily as ctx
+import requests
+from PIL import Image
+
+from izvcache import atomic_file, evict_files
+
+# Disk store of basemap tiles in {tile_dir}/{provider}/{z}/{x}/{y}.png. It
+# is seeded for the Czech Republic ahead of time (seed_tiles), plots then
+# assemble basemaps from it without network access. The mtime of a tile is
+# refreshed on every use and eviction removes the least recently used ones.
+
+TILE_DIR = os.path.join(".izv_cache", "tiles")
+
+# default provider of the geo plots
+TILE_SOURCE = ctx.providers.OpenStreetMap.Mapnik
+
+# limit of the tile store applied after seeding and downloading
+MAX_TILE_BYTES = 1024 * 1024 * 1024
+
+# bounds of the Czech Republic in WGS 84 (lon, lat)
+CZ_BOUNDS_LON = (12.09, 18.86)
+CZ_BOUNDS_LAT = (48.55, 51.06)
+
+# most tiles assembled into one basemap, zoom is lowered to fit
+MAX_TILES = 64
+
+# plain background used where no tile is available (land color of Mapnik)
+BACKGROUND = "#f2efe9"
+
+TILE_SIZE = 256
+_EARTH = 6378137.0 * math.pi
+
+# set after the first connection error or timeout, later basemaps use only
+# the store
+_offline = False
+
+
+def _zoom_dir(tile_dir: str, source, z: int) -> str:
+    return os.path.join(tile_dir, source.name, str(z))
+
+
+def _tile_file(tile_dir: str, source, z: int, x: int, y: int) -> str:
+    return os.path.join(_zoom_dir(tile_dir, source, z), str(x), f"{y}.png")
+
+
+def _tile_range(lon: tuple, lat: tuple, z: int) -> tuple:
+    # x and y ranges (inclusive) of tiles covering the lon/lat box
+    n = 2 ** z
+    lat_rad = np.radians(np.clip(lat, -85.0511, 85.0511))
+    xs = ((np.asarray(lon) + 180.0) / 360.0 * n).astype(int)
+    ys = (
+        (1.0 - np.arcsinh(np.tan(lat_rad)) / math.pi) / 2.0 * n
+    ).astype(int)
+    xs = np.clip(xs, 0, n - 1)
+    ys = np.clip(ys, 0, n - 1)
+    return (xs.min(), xs.max()), (ys.min(), ys.max())
+
+
+def _mercator_range(x: tuple, y: tuple, z: int) -> tuple:
+    # x and y ranges (inclusive) of tiles covering the Web Mercator box
+    n = 2 ** z
+    size = 2 * _EARTH / n
+    xs = np.clip(((np.asarray(x) + _EARTH) // size).astype(int), 0, n - 1)
+    ys = np.clip(((_EARTH - np.asarray(y)) // size).astype(int), 0, n - 1)
+    return (xs.min(), xs.max()), (ys.min(), ys.max())
+
+
+def _zoom(x: tuple, y: tuple, max_zoom: int) -> int:
+    # zoom with tiles of about a quarter of the box, lowered to MAX_TILES
+    span = max(x[1] - x[0], y[1] - y[0], 1.0)
+    z = int(np.clip(math.ceil(math.log2(8 * _EARTH / span)), 0, max_zoom))
+    while z > 0:
+        (x0, x1), (y0, y1) = _mercator_range(x, y, z)
+        if (x1 - x0 + 1) * (y1 - y0 + 1) <= MAX_TILES:
+            break
+        z -= 1
+    return z
+
+
+def _download(session, source, path: str, z: int, x: int, y: int,
+              timeout: float) -> bool:
+    global _offline
+    if _offline:
+        return False
+
+    try:
+        response = session.get(
+            source.build_url(x=x, y=y, z=z),
+            headers={"user-agent": "izv-tiles"},
+            timeout=timeout,
+        )
+    except (requests.ConnectionError, requests.Timeout):
+        # no network, do not try again for every tile of every plot
+        _offline = True
+        return False
+    except requests.RequestException:
+        return False
+    if not response.ok:
+        # missing tile (404) or rate limit (429), only this tile is skipped
+        return False
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with atomic_file(path) as tmp_file:
+        with open(tmp_file, "wb") as f:
+            f.write(response.content)
+    return True
+
+
+def seed_tiles(
+    zooms: list,
+    tile_dir: str = TILE_DIR,
+    source=TILE_SOURCE,
+    lon: tuple = CZ_BOUNDS_LON,
+    lat: tuple = CZ_BOUNDS_LAT,
+    max_bytes: int = MAX_TILE_BYTES,
+    timeout: float = 10,
+    session: requests.Session = None,
+) -> int:
+    """
+    Function that downloads tiles covering a box (by default the Czech
+    Republic) into the tile store, already stored tiles and tiles refused
+    by the server (HTTP errors) are skipped.
+    :param zooms: Zoom levels to download
+    :param tile_dir: Directory of the tile store
+    :param source: Tile provider of contextily
+    :param lon: Minimal and maximal longitude of the box
+    :param lat: Minimal and maximal latitude of the box
+    :param max_bytes: Maximal size of the tile store
+    :param timeout: Timeout of a request in seconds
+    :param session: Session used for requests
+    :return: Number of downloaded tiles
+    """
+    global _offline
+    _offline = False
+    session = session or requests.Session()
+
+    downloaded = 0
+    for z in zooms:
+        (x0, x1), (y0, y1) = _tile_range(lon, lat, z)
+        for x in range(x0, x1 + 1):
+            for y in range(y0, y1 + 1):
+                path = _tile_file(tile_dir, source, z, x, y)
+                if os.path.exists(path):
+                    continue
+                if _download(session, source, path, z, x, y, timeout):
+                    downloaded += 1
+                elif _offline:
+                    raise ConnectionError(f"Can not download tile {path}")
+
+    evict_tiles(tile_dir, max_bytes)
+    return downloaded
+
+
+def evict_tiles(tile_dir: str = TILE_DIR,
+                max_bytes: int = MAX_TILE_BYTES) -> int:
+    """
+    Function that removes the least recently used tiles until the tile
+    store fits into max_bytes.
+    :param tile_dir: Directory of the tile store
+    :param max_bytes: Maximal size of the tile store
+    :return: Number of removed tiles
+    """
+    return evict_files(
+        (
+            os.path.join(root, name)
+            for root, _, files in os.walk(tile_dir)
+            for name in files
+        ),
+        max_bytes,
+    )
+
+
+def _read_tile(path: str) -> np.ndarray:
+    # RGBA bytes of a stored tile, None when the tile is missing or broken
+    try:
+        with Image.open(path) as image:
+            tile = np.asarray(image.convert("RGBA"))
+    except (FileNotFoundError, OSError, ValueError, SyntaxError):
+        return None
+    if tile.shape[:2] != (TILE_SIZE, TILE_SIZE):
+        return None
+    os.utime(path)
+    return tile
+
+
+def _store_zoom(tile_dir: str, source, zoom: int) -> int:
+    # closest lower zoom present in the store, used without network
+    while zoom > 0 and not os.path.isdir(_zoom_dir(tile_dir, source, zoom)):
+        zoom -= 1
+    return zoom
+
+
+def _mosaic(
+    x: tuple,
+    y: tuple,
+    source,
+    zoom: int,
+    tile_dir: str,
+    session,
+    timeout: float,
+) -> tuple:
+    # RGBA bytes of tiles covering the box with their Web Mercator extent,
+    # number of missing tiles and whether any tile was downloaded
+    (x0, x1), (y0, y1) = _mercator_range(x, y, zoom)
+
+    # bytes like the tiles, float64 RGBA of MAX_TILES tiles takes 134 MB
+    image = np.empty(
+        ((y1 - y0 + 1) * TILE_SIZE, (x1 - x0 + 1) * TILE_SIZE, 4),
+        dtype=np.uint8,
+    )
+    image[:] = np.round(np.array(mcolors.to_rgba(BACKGROUND)) * 255)
+
+    missing = 0
+    downloaded = False
+    for tx in range(x0, x1 + 1):
+        for ty in range(y0, y1 + 1):
+            path = _tile_file(tile_dir, source, zoom, tx, ty)
+            tile = _read_tile(path)
+            if tile is None and session is not None and _download(
+                session, source, path, zoom, tx, ty, timeout
+            ):
+                downloaded = True
+                tile = _read_tile(path)
+            if tile is None:
+                missing += 1
+                continue
+
+            row = (ty - y0) * TILE_SIZE
+            col = (tx - x0) * TILE_SIZE
+            image[row:row + TILE_SIZE, col:col + TILE_SIZE] = tile
+
+    size = 2 * _EARTH / 2 ** zoom
+    extent = (
+        -_EARTH + x0 * size,
+        -_EARTH + (x1 + 1) * size,
+        _EARTH - (y1 + 1) * size,
+        _EARTH - y0 * size,
+    )
+    return image, extent, missing, downloaded
+
+
+def add_basemap(
+    ax,
+    source=TILE_SOURCE,
+    alpha: float = 1.0,
+    zoom: int = None,
+    tile_dir: str = TILE_DIR,
+    download: bool = True,
+    max_bytes: int = MAX_TILE_BYTES,
+    timeout: float = 5,
+) -> int:
+    """
+    Function that draws basemap from the tile store under data of Web
+    Mercator (EPSG:3857) axes. Missing tiles are downloaded into the store
+    if download is allowed and network is available, otherwise they are
+    left in plain background color.
+    :param ax: Axes with data in Web Mercator
+    :param source: Tile provider of contextily
+    :param alpha: Alpha of the basemap
+    :param zoom: Zoom level, by default chosen from extent of the axes
+        (without network the closest lower zoom present in the store)
+    :param tile_dir: Directory of the tile store
+    :param download: If False, network is never used
+    :param max_bytes: Maximal size of the tile store
+    :param timeout: Timeout of a request in seconds
+    :return: Number of tiles left in plain background color, 0 when the
+        basemap is complete
+    """
+    x = ax.get_xlim()
+    y = ax.get_ylim()
+    auto_zoom = zoom is None
+    if auto_zoom:
+        zoom = _zoom(x, y, source.get("max_zoom", 19))
+        if not download or _offline:
+            zoom = _store_zoom(tile_dir, source, zoom)
+
+    online = download and not _offline
+    session = requests.Session() if online else None
+    image, extent, missing, downloaded = _mosaic(
+        x, y, source, zoom, tile_dir, session, timeout
+    )
+    if auto_zoom and online and _offline:
+        # network turned out to be unavailable while the mosaic was
+        # assembled, zoom was chosen for downloading and may not be seeded
+        store_zoom = _store_zoom(tile_dir, source, zoom)
+        if store_zoom != zoom:
+            image, extent, missing, _ = _mosaic(
+                x, y, source, store_zoom, tile_dir, None, timeout
+            )
+
+    if downloaded:
+        evict_tiles(tile_dir, max_bytes)
+
+    # drawn even without any tile, axes are often hidden (set_axis_off) so
+    # their face color would not show
+    ax.imshow(image, extent=extent, alpha=alpha, interpolation="bilinear",
+              zorder=-1)
+    # keep extent of the data, imshow would stretch axes to whole tiles
+    ax.set_xlim(x)
+    ax.set_ylim(y)
+    return missing
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Seeds tile store with basemap of the Czech Republic"
+    )
+    parser.add_argument("--tile-dir", default=TILE_DIR)
+    parser.add_argument("--zoom", type=int, nargs="+", default=[7, 8, 9])
+    parser.add_argument("--max-mb", type=float,
+                        default=MAX_TILE_BYTES / 1024 / 1024)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    count = seed_tiles(
+        args.zoom, args.tile_dir, max_bytes=int(args.max_mb * 1024 * 1024)
+    )
+    print(f"Downloaded {count} tiles into {args.tile_dir} "
+          f"in {time.perf_counter() - start:.1f} s")